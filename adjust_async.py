@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+ADJUST ASYNC
+Pull Adjust asynchrone pour les runs multi-clients
+
+Lance des dizaines de rapports (client × app) en parallèle dans une seule
+boucle asyncio, bornés par un sémaphore et par le token bucket / budget de
+retries du client partagé de chaque token API (voir adjust_client).
+Chaque résultat est le même DataFrame que AdjustClient.pull (trié par 'Day (date)'), prêt pour
+transform_data.
+
+prefetch_reports regroupe aussi les apps d'un même compte (ex: Lalalab iOS
+et Android) en une seule requête app_token__in, redécoupée par app.
+
+Dépendance optionnelle : aiohttp (pip3 install aiohttp). Sans aiohttp,
+ASYNC_AVAILABLE vaut False et les scripts restent en mode séquentiel.
+
+Usage:
+    from adjust_async import pull_many
+    dfs = pull_many([
+        {"api_token": "...", "app_token": "...", "begin_date": "2025-11-01", "end_date": "2025-11-30"},
+        ...
+    ])
+"""
+
+import pandas as pd
+import asyncio
+import io
+import json
+
+try:
+    import aiohttp
+    ASYNC_AVAILABLE = True
+except ImportError:
+    aiohttp = None
+    ASYNC_AVAILABLE = False
+
+from adjust_cache import get_default_cache
+from adjust_schema import read_adjust_csv
+from adjust_client import (
+    ADJUST_REPORT_ENDPOINT,
+    ACCEPT_ENCODING,
+    DEFAULT_TIMEOUT,
+    RETRYABLE_STATUS,
+    DEFAULT_DIMENSIONS,
+    add_app_token_dimension,
+    build_report_params,
+    get_adjust_client,
+    parse_retry_after,
+    split_by_app_token
+)
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+DEFAULT_CONCURRENCY = 10  # Rapports téléchargés simultanément (tous tokens confondus)
+
+
+# =============================================================================
+# FONCTIONS ASYNC
+# =============================================================================
+
+def _query_params(params: dict) -> dict:
+    """aiohttp refuse les bool dans la query string : même rendu que requests ("True")."""
+    return {k: str(v) if isinstance(v, bool) else v for k, v in params.items()}
+
+
+async def _fetch_report(session, semaphore, client, params: dict, cache) -> pd.DataFrame:
+    """
+    Télécharge un csv_report (avec retries) et retourne le DataFrame brut.
+
+    Même politique que AdjustClient._get : token bucket du client (partagé
+    par token API avec les pulls synchrones), pause de tout le token sur
+    429/Retry-After et retries imputés au budget du client.
+    """
+    if cache is not None:
+        df = cache.get(params)
+        if df is not None:
+            return df
+
+    headers = {
+        "Authorization": f"Bearer {client.api_token}",
+        "Accept-Encoding": ACCEPT_ENCODING
+    }
+
+    for attempt in range(client.max_retries + 1):
+        async with semaphore:
+            # acquire() est bloquant : attendu dans un thread pour ne pas figer la boucle
+            await asyncio.to_thread(client.throttle)
+            async with session.get(
+                ADJUST_REPORT_ENDPOINT, params=_query_params(params), headers=headers
+            ) as response:
+                status = response.status
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                # Corps décompressé à la volée par aiohttp
+                body = await response.read()
+
+        if status not in RETRYABLE_STATUS:
+            client.rate_limiter.on_success()
+            break
+
+        if attempt == client.max_retries or not client.take_retry_budget():
+            break
+
+        delay = client.backoff_delay(status, retry_after, attempt)
+        print(f"   ⚠️  HTTP {status} ({params['date_period']}), retry {attempt + 1}/{client.max_retries} dans {delay:.1f}s")
+        # Le sémaphore est relâché pendant l'attente
+        await asyncio.sleep(delay)
+
+    if status != 200:
+        print(f"❌ Erreur API ({params['date_period']}): {status}")
+        print(body.decode("utf-8", errors="replace"))
+        raise ValueError(f"Failed to retrieve data: {status}")
+
+    # Parsing CSV hors de la boucle d'événements
+    df = await asyncio.to_thread(read_adjust_csv, io.BytesIO(body))
+
+    if cache is not None:
+        cache.put(params, df)
+    return df
+
+
+async def _pull(session, semaphore, job: dict, cache):
+    job = dict(job)
+    api_token = job.pop("api_token")
+    app_tokens = job.pop("app_tokens", None)
+
+    # Job batch : plusieurs apps en une requête, redécoupées ensuite
+    if app_tokens:
+        job["app_token"] = ",".join(app_tokens)
+        job["dimensions"], added = add_app_token_dimension(job.get("dimensions", DEFAULT_DIMENSIONS))
+    label = job.pop("label", job["app_token"])
+
+    params = build_report_params(**job)
+    # Client partagé : même token bucket et même budget de retries que les pulls synchrones
+    client = get_adjust_client(api_token)
+    df = await _fetch_report(session, semaphore, client, params, cache)
+
+    df = df.sort_values('Day (date)', kind='stable')
+    print(f"   ✅ {label}: {len(df)} lignes récupérées")
+    if app_tokens:
+        return split_by_app_token(df, app_tokens, drop_column=added)
+    return df
+
+
+async def pull_many_async(jobs: list, max_concurrency: int = DEFAULT_CONCURRENCY, cache="default") -> list:
+    """
+    Version coroutine de pull_many (à utiliser depuis une boucle existante).
+    """
+    if not ASYNC_AVAILABLE:
+        raise ImportError("aiohttp n'est pas installé - Lance: pip3 install aiohttp")
+
+    if cache == "default":
+        cache = get_default_cache()
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+    connector = aiohttp.TCPConnector(limit=max_concurrency, ttl_dns_cache=300)
+    timeout = aiohttp.ClientTimeout(total=DEFAULT_TIMEOUT)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        return await asyncio.gather(
+            *(_pull(session, semaphore, job, cache) for job in jobs),
+            return_exceptions=True
+        )
+
+
+def pull_many(jobs: list, max_concurrency: int = DEFAULT_CONCURRENCY, cache="default") -> list:
+    """
+    Télécharge plusieurs rapports Adjust en parallèle.
+
+    Args:
+        jobs: Liste de dicts avec "api_token" + les arguments de pull_from_adjust
+              (app_token, begin_date, end_date, adjust_account_id, dimensions,
+              metrics, include_revenue, events, store_id) et un "label" optionnel
+              pour les logs. Un job avec "app_tokens" (liste) à la place de
+              "app_token" est un batch multi-apps (voir AdjustClient.pull_batch)
+        max_concurrency: Nombre max de requêtes en vol
+        cache: AdjustCache à utiliser, None pour désactiver ("default" = cache partagé)
+
+    Returns:
+        Liste dans l'ordre des jobs : DataFrame (dict app_token → DataFrame
+        pour un batch), ou l'exception levée pour ce job
+    """
+    print(f"📥 Pull Adjust asynchrone: {len(jobs)} rapports ({max_concurrency} max en parallèle)")
+    return asyncio.run(pull_many_async(jobs, max_concurrency=max_concurrency, cache=cache))
+
+
+# =============================================================================
+# PREFETCH MULTI-CLIENTS
+# =============================================================================
+
+def build_prefetch_jobs(configs: list, begin_date: str, end_date: str, build_pull_kwargs) -> list:
+    """
+    Regroupe les configs qui ne diffèrent que par l'app_token (même token API,
+    même compte, mêmes dimensions/métriques/période) en un seul job batch.
+
+    Returns:
+        Liste de (job, [(client, app_token), ...])
+    """
+    groups = {}
+    for config in configs:
+        kwargs = build_pull_kwargs(config, begin_date, end_date)
+        app_token = kwargs.pop("app_token")
+        key = (config['api_token'], json.dumps(kwargs, sort_keys=True, default=str))
+        group = groups.setdefault(key, {"kwargs": kwargs, "api_token": config['api_token'], "members": []})
+        group["members"].append((config['client'], app_token))
+
+    jobs = []
+    for group in groups.values():
+        members = group["members"]
+        app_tokens = list(dict.fromkeys(app_token for _, app_token in members))
+        job = {
+            "api_token": group["api_token"],
+            "label": ", ".join(client for client, _ in members),
+            **group["kwargs"]
+        }
+        if len(app_tokens) > 1:
+            job["app_tokens"] = app_tokens
+        else:
+            job["app_token"] = app_tokens[0]
+        jobs.append((job, members))
+    return jobs
+
+
+def _pull_job_sync(job: dict):
+    """Exécute un job (simple ou batch) avec le client Adjust partagé."""
+    job = dict(job)
+    client = get_adjust_client(job.pop("api_token"))
+    job.pop("label", None)
+    if "app_tokens" in job:
+        return client.pull_batch(job.pop("app_tokens"), **job)
+    return client.pull(**job)
+
+
+def prefetch_reports(configs: list, begin_date: str, end_date: str, build_pull_kwargs) -> dict:
+    """
+    Télécharge les rapports Adjust de tous les clients avant le pipeline.
+
+    - Les apps d'un même compte sont regroupées en une requête (app_token__in)
+    - Les requêtes partent en parallèle si aiohttp est installé, sinon en séquentiel
+
+    Args:
+        configs: Configs clients
+        build_pull_kwargs: fonction (config, begin_date, end_date) → kwargs de pull
+
+    Returns:
+        dict client → DataFrame brut. Les clients absents (pull en erreur)
+        sont à pull en séquentiel par le pipeline.
+    """
+    jobs = build_prefetch_jobs(configs, begin_date, end_date, build_pull_kwargs)
+    if not jobs:
+        return {}
+
+    print(f"📥 Prefetch: {len(configs)} clients → {len(jobs)} requêtes Adjust")
+    if ASYNC_AVAILABLE and len(jobs) > 1:
+        results = pull_many([job for job, _ in jobs])
+    else:
+        results = []
+        for job, _ in jobs:
+            try:
+                results.append(_pull_job_sync(job))
+            except Exception as e:
+                results.append(e)
+
+    prefetched = {}
+    for (job, members), result in zip(jobs, results):
+        for client, app_token in members:
+            if isinstance(result, Exception):
+                print(f"⚠️  {client}: prefetch en échec ({result}), retry séquentiel")
+            elif isinstance(result, dict):
+                prefetched[client] = result[app_token]
+            else:
+                prefetched[client] = result
+    return prefetched
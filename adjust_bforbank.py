@@ -15,11 +15,13 @@ import gspread
 # Importe toutes les fonctions depuis adjust_to_gsheet
 from adjust_to_gsheet import (
     get_gspread_client,
-    pull_from_adjust,
     transform_data,
     push_to_gsheet,
-    ADJUST_API_TOKEN
+    build_pushdown_filters
 )
+from adjust_client import get_adjust_client
+from adjust_async import prefetch_reports
+from adjust_parallel import transform_clients
 
 # =============================================================================
 # CONFIGURATION
@@ -140,7 +142,10 @@ def load_bforbank_configs(gc: gspread.Client) -> list:
                 "agg_columns": agg_columns,
                 "repush_all": False,
                 "group_by_most_spending_campaign": False,
-                "compute_ctr": False
+                "compute_ctr": False,
+                # Plafond optionnel : top K campagne/adgroup/créa par jour/pays (vide = pas de plafond)
+                "top_k": row.get('top_k', ''),
+                "top_k_metric": row.get('top_k_metric', '')
             }
             
             configs.append(config)
@@ -152,8 +157,32 @@ def load_bforbank_configs(gc: gspread.Client) -> list:
         raise
 
 
-def run_client_pipeline(config: dict, begin_date: str, end_date: str, gc: gspread.Client):
-    """Lance le pipeline pour un client Bforbank"""
+def build_pull_kwargs(config: dict, begin_date: str, end_date: str) -> dict:
+    """Arguments de pull Adjust pour un client Bforbank"""
+    return {
+        "app_token": config["app_token"],
+        "begin_date": begin_date,
+        "end_date": end_date,
+        "adjust_account_id": config.get("adjust_account_id"),
+        "dimensions": "day,country,network,campaign,creative,adgroup",
+        "include_revenue": False,  # Bforbank n'a pas les revenues
+        # Filtres network / pays / start_date poussés dans la requête
+        **build_pushdown_filters(config, begin_date, end_date)
+    }
+
+
+def run_client_pipeline(
+    config: dict,
+    begin_date: str,
+    end_date: str,
+    gc: gspread.Client,
+    df_raw: pd.DataFrame = None,
+    df_transformed: pd.DataFrame = None
+):
+    """
+    Lance le pipeline pour un client Bforbank (df_raw = rapport déjà téléchargé,
+    df_transformed = résultat déjà transformé par transform_clients)
+    """
     client_name = config['client']
     
     print("\n" + "=" * 60)
@@ -162,29 +191,19 @@ def run_client_pipeline(config: dict, begin_date: str, end_date: str, gc: gsprea
     print(f"📅 Période: {begin_date} → {end_date}")
     
     try:
-        # 1. Pull Adjust
-        dimensions = "day,country,network,campaign,creative,adgroup"
-        include_revenue = False  # Bforbank n'a pas les revenues
-        
-        # Utilise l'API token spécifique
-        import adjust_to_gsheet
-        original_token = adjust_to_gsheet.ADJUST_API_TOKEN
-        adjust_to_gsheet.ADJUST_API_TOKEN = config['api_token']
-        
-        df = pull_from_adjust(
-            app_token=config["app_token"],
-            begin_date=begin_date,
-            end_date=end_date,
-            adjust_account_id=config.get("adjust_account_id"),
-            dimensions=dimensions,
-            include_revenue=include_revenue
-        )
-        
-        # Restaure le token
-        adjust_to_gsheet.ADJUST_API_TOKEN = original_token
-        
-        # 2. Transform
-        df = transform_data(df, config)
+        if df_transformed is not None:
+            df = df_transformed
+        else:
+            # 1. Pull Adjust (sauf si déjà pré-téléchargé)
+            if df_raw is not None:
+                df = df_raw
+            else:
+                # Utilise le client Adjust partagé du token API spécifique
+                adjust_client = get_adjust_client(config['api_token'])
+                df = adjust_client.pull(**build_pull_kwargs(config, begin_date, end_date))
+            
+            # 2. Transform
+            df = transform_data(df, config)
         
         # 3. Aperçu
         print("\n📊 Aperçu des données:")
@@ -243,15 +262,25 @@ def main():
     for config in configs:
         print(f"   - {config['client']}")
     
-    # 3. Lance le pipeline pour chaque client
+    # 3. Pré-télécharge tous les rapports (apps d'un même compte groupées, en parallèle si aiohttp)
+    prefetched = prefetch_reports(configs, begin_date, end_date, build_pull_kwargs)
+    
+    # 4. Transformations en parallèle (un process par client) si plusieurs cœurs
+    transformed = transform_clients(configs, prefetched)
+    
+    # 5. Lance le pipeline pour chaque client
     results = {}
     
     for config in configs:
         client_name = config['client']
-        success = run_client_pipeline(config, begin_date, end_date, gc)
+        success = run_client_pipeline(
+            config, begin_date, end_date, gc,
+            df_raw=prefetched.get(client_name),
+            df_transformed=transformed.pop(client_name, None)
+        )
         results[client_name] = success
     
-    # 4. Rapport final
+    # 6. Rapport final
     print("\n" + "=" * 60)
     print("📊 RAPPORT FINAL")
     print("=" * 60)
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+ADJUST CACHE
+Cache disque des réponses csv_report Adjust
+
+Clé = hash de TOUS les paramètres de la requête (app_token, account,
+dimensions, métriques, date_period, store_id, ...). Le token API n'en fait
+pas partie (il est dans les headers) et n'est jamais écrit sur disque.
+
+- TTL : une entrée expire après ttl_hours (les revenues récentes bougent)
+- Maturation : si toute la période est plus vieille que la fenêtre de
+  maturation des revenues (30 jours, cf. d30), les chiffres ne bougent plus
+  → l'entrée est immuable, jamais expirée ni re-téléchargée
+- Taille : au-delà de max_size_mb, éviction LRU (les entrées immuables
+  sont évincées en dernier)
+"""
+
+import pandas as pd
+import os
+import json
+import time
+import hashlib
+import threading
+from datetime import date, datetime, timedelta
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+DEFAULT_CACHE_DIR = ".adjust_cache"
+DEFAULT_TTL_HOURS = 6
+DEFAULT_MAX_SIZE_MB = 500
+REVENUE_MATURATION_DAYS = 30  # all_revenue_total_d30 figé après 30 jours
+
+
+# =============================================================================
+# CACHE
+# =============================================================================
+
+def cache_key(params: dict) -> str:
+    """Hash stable des paramètres de requête (ordre des clés indifférent)."""
+    canonical = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def is_matured(params: dict, maturation_days: int = REVENUE_MATURATION_DAYS, today: date = None) -> bool:
+    """True si la fin de date_period est antérieure à la fenêtre de maturation."""
+    today = today or date.today()
+    end_date = params["date_period"].split(":")[-1]
+    end = datetime.strptime(end_date, "%Y-%m-%d").date()
+    return end < today - timedelta(days=maturation_days)
+
+
+class AdjustCache:
+    """
+    Cache disque (DataFrame pickle + métadonnées JSON) partagé entre les clients.
+
+    Args:
+        cache_dir: Dossier du cache
+        ttl_hours: Durée de vie des entrées non immuables
+        max_size_mb: Taille max du dossier avant éviction LRU
+        maturation_days: Au-delà, les données sont considérées immuables
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = DEFAULT_CACHE_DIR,
+        ttl_hours: float = DEFAULT_TTL_HOURS,
+        max_size_mb: float = DEFAULT_MAX_SIZE_MB,
+        maturation_days: int = REVENUE_MATURATION_DAYS
+    ):
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_hours * 3600
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024)
+        self.maturation_days = maturation_days
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _paths(self, key: str):
+        base = os.path.join(self.cache_dir, key)
+        return base + ".pkl", base + ".json"
+
+    def _remove(self, key: str):
+        for path in self._paths(key):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def get(self, params: dict):
+        """Retourne le DataFrame en cache, ou None (absent / expiré / illisible)."""
+        key = cache_key(params)
+        data_path, meta_path = self._paths(key)
+
+        with self._lock:
+            if not (os.path.exists(data_path) and os.path.exists(meta_path)):
+                return None
+
+            try:
+                with open(meta_path) as f:
+                    meta = json.load(f)
+                expired = (
+                    not meta["immutable"]
+                    and time.time() - meta["created_at"] > self.ttl_seconds
+                )
+                if expired:
+                    self._remove(key)
+                    return None
+
+                df = pd.read_pickle(data_path)
+            except Exception as e:
+                print(f"⚠️  Entrée cache illisible ({key[:12]}), ignorée: {e}")
+                self._remove(key)
+                return None
+
+            # LRU : la date de modification sert de date de dernier accès
+            os.utime(data_path)
+
+        label = "immuable" if meta["immutable"] else "récent"
+        print(f"   💾 Cache hit ({label}): {params['date_period']}")
+        return df
+
+    def put(self, params: dict, df: pd.DataFrame):
+        """Enregistre la réponse puis applique la limite de taille."""
+        key = cache_key(params)
+        data_path, meta_path = self._paths(key)
+        meta = {
+            "params": params,
+            "created_at": time.time(),
+            "immutable": is_matured(params, self.maturation_days)
+        }
+
+        with self._lock:
+            # Écriture atomique : un run interrompu ne laisse pas d'entrée corrompue
+            df.to_pickle(data_path + ".tmp")
+            with open(meta_path + ".tmp", "w") as f:
+                json.dump(meta, f, default=str)
+            os.replace(data_path + ".tmp", data_path)
+            os.replace(meta_path + ".tmp", meta_path)
+
+            self._evict()
+
+    def _evict(self):
+        """Supprime les entrées les moins récemment utilisées au-delà de max_size."""
+        entries = []
+        total_size = 0
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".pkl"):
+                continue
+            key = name[:-len(".pkl")]
+            data_path, meta_path = self._paths(key)
+            try:
+                size = os.path.getsize(data_path)
+                if os.path.exists(meta_path):
+                    size += os.path.getsize(meta_path)
+                    with open(meta_path) as f:
+                        immutable = json.load(f).get("immutable", False)
+                else:
+                    immutable = False
+                last_used = os.path.getmtime(data_path)
+            except (OSError, ValueError):
+                continue
+            entries.append((immutable, last_used, size, key))
+            total_size += size
+
+        if total_size <= self.max_size_bytes:
+            return
+
+        # Non immuables d'abord, puis du plus ancien au plus récent
+        evicted = 0
+        for immutable, last_used, size, key in sorted(entries):
+            if total_size <= self.max_size_bytes:
+                break
+            self._remove(key)
+            total_size -= size
+            evicted += 1
+
+        print(f"   🧹 Cache: {evicted} entrées évincées (limite {self.max_size_bytes / 1024 / 1024:.0f} Mo)")
+
+    def clear(self):
+        """Vide complètement le cache."""
+        with self._lock:
+            for name in os.listdir(self.cache_dir):
+                os.remove(os.path.join(self.cache_dir, name))
+
+
+_DEFAULT_CACHE = None
+
+
+def get_default_cache() -> AdjustCache:
+    """Cache partagé par défaut (dossier .adjust_cache du répertoire courant)."""
+    global _DEFAULT_CACHE
+    if _DEFAULT_CACHE is None:
+        _DEFAULT_CACHE = AdjustCache()
+    return _DEFAULT_CACHE
@@ -0,0 +1,724 @@
+#!/usr/bin/env python3
+"""
+ADJUST CLIENT
+Client HTTP réutilisable pour le reports-service Adjust
+
+Une seule Session requests (pool de connexions keep-alive) par token API :
+les scripts clients (multi-clients, Bforbank, Lalalab, FDJ) partagent les
+connexions TLS au lieu de refaire un handshake à chaque pull.
+
+Usage:
+    from adjust_client import get_adjust_client
+    client = get_adjust_client(config["api_token"])
+    df = client.pull(app_token, begin_date, end_date, ...)
+"""
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+import io
+import time
+import random
+import threading
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from adjust_cache import AdjustCache, get_default_cache
+from adjust_schema import apply_schema, read_adjust_csv
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+ADJUST_REPORT_ENDPOINT = "https://automate.adjust.com/reports-service/csv_report"
+
+# Pool HTTP par défaut
+DEFAULT_POOL_CONNECTIONS = 4   # Nombre de pools d'hôtes gardés en cache
+DEFAULT_POOL_MAXSIZE = 8       # Connexions simultanées max par hôte
+DEFAULT_TIMEOUT = 300          # Secondes (les gros rapports sont lents)
+
+# Lecture en streaming : nombre de lignes CSV par chunk
+DEFAULT_CHUNKSIZE = 100_000
+
+# Throttling / retries (par token API)
+DEFAULT_RATE_PER_SECOND = 2.0  # Débit cible initial (remonte tant qu'il n'y a pas de 429)
+DEFAULT_MAX_RATE_PER_SECOND = 10.0
+DEFAULT_BURST = 5
+DEFAULT_MAX_RETRIES = 5
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 60.0
+RETRY_BUDGET_RATIO = 0.2       # Retries max = 20% des requêtes...
+RETRY_BUDGET_MIN = 10          # ... + 10 (évite les tempêtes de retries)
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+# Batch multi-apps : colonne ajoutée par la dimension app_token (readable_names,
+# typée category par adjust_schema)
+APP_TOKEN_COLUMN = "App Token"
+DEFAULT_DIMENSIONS = "day,country,network,campaign,creative,adgroup"
+
+# Filtres côté API : readable_names renvoie "France", le filtre attend le code ISO
+COUNTRY_CODES = {
+    "France": "fr",
+    "Germany": "de",
+    "Italy": "it",
+    "Spain": "es",
+    "Belgium": "be",
+    "Netherlands": "nl",
+    "Switzerland": "ch",
+    "Austria": "at",
+    "Portugal": "pt",
+    "Luxembourg": "lu",
+    "United Kingdom": "gb",
+    "Ireland": "ie",
+    "United States": "us",
+    "Canada": "ca",
+    "Poland": "pl",
+    "Sweden": "se",
+    "Denmark": "dk",
+    "Norway": "no",
+    "Finland": "fi"
+}
+
+
+def _supported_encodings() -> str:
+    """Encodages de compression que urllib3 sait décompresser ici (br si brotli installé)."""
+    encodings = ["gzip", "deflate"]
+    try:
+        import brotli  # noqa: F401
+        encodings.append("br")
+    except ImportError:
+        try:
+            import brotlicffi  # noqa: F401
+            encodings.append("br")
+        except ImportError:
+            pass
+    return ", ".join(encodings)
+
+
+ACCEPT_ENCODING = _supported_encodings()
+
+
+def country_codes(countries: list):
+    """
+    Convertit des noms de pays (readable_names) en codes ISO pour country_code__in.
+
+    Retourne None si un pays est inconnu : on ne filtre alors pas côté API
+    (le filtre local de transform_data reste appliqué).
+    """
+    codes = []
+    for country in countries:
+        code = COUNTRY_CODES.get(country)
+        if code is None and len(country) == 2:
+            code = country.lower()
+        if code is None:
+            return None
+        codes.append(code)
+    return codes
+
+
+# =============================================================================
+# UTILITAIRES
+# =============================================================================
+
+def split_date_range(begin_date: str, end_date: str, shard: str = "week") -> list:
+    """
+    Découpe une période en fenêtres contiguës (jour ou semaine).
+
+    Exemple:
+    ("2025-01-01", "2025-01-10", "week") → [("2025-01-01", "2025-01-07"), ("2025-01-08", "2025-01-10")]
+    """
+    if shard not in ("day", "week"):
+        raise ValueError(f"Shard inconnu: {shard} (attendu: 'day' ou 'week')")
+
+    step = timedelta(days=1 if shard == "day" else 7)
+    start = datetime.strptime(begin_date, "%Y-%m-%d").date()
+    end = datetime.strptime(end_date, "%Y-%m-%d").date()
+
+    windows = []
+    while start <= end:
+        window_end = min(start + step - timedelta(days=1), end)
+        windows.append((start.strftime("%Y-%m-%d"), window_end.strftime("%Y-%m-%d")))
+        start = window_end + timedelta(days=1)
+    return windows
+
+
+def build_report_params(
+    app_token: str,
+    begin_date: str,
+    end_date: str,
+    adjust_account_id: str = None,
+    dimensions: str = "day,country,network,campaign,creative,adgroup",
+    metrics: str = None,
+    include_revenue: bool = False,
+    events: list = None,
+    store_id: str = None,
+    networks: list = None,
+    countries: list = None
+) -> dict:
+    """Construit les paramètres de la requête csv_report (voir pull_from_adjust)."""
+    # Métriques par défaut selon le client
+    if metrics is None:
+        if include_revenue:
+            metrics = "installs,clicks,impressions,revenue,all_revenue_total_d0,all_revenue_total_d7,all_revenue_total_d30"
+        else:
+            metrics = "installs,clicks,impressions"
+
+    # ✅ Ajouter les événements aux métriques (SANS suffixes d0/d7/d30)
+    if events:
+        # On ajoute juste les événements tels quels
+        metrics = metrics + "," + ",".join(events)
+        print(f"   📊 Événements ajoutés: {', '.join(events)}")
+
+    params = {
+        "date_period": f"{begin_date}:{end_date}",
+        "dimensions": dimensions,
+        "metrics": metrics,
+        "readable_names": True,
+        "utc_offset": "+01:00",  # Paris timezone (UTC+1)
+        "attribution_source": "first",  # ✅ CORRIGÉ : utilise First attribution (pas Dynamic)
+        "attribution_type": "all",  # Type d'attribution (all/click/impression)
+        "currency": "EUR",
+        "app_token__in": app_token
+    }
+
+    # CRITIQUE : Ajouter l'account ID si fourni
+    if adjust_account_id:
+        params['adjust_account_id'] = adjust_account_id
+        print(f"   Account ID: {adjust_account_id}")
+
+    # ✅ NOUVEAU : Ajouter le store_id si fourni
+    if store_id:
+        params['store_id'] = store_id
+        print(f"   Store ID: {store_id}")
+
+    # Filtres poussés dans la requête (moins de lignes à télécharger et parser)
+    if networks:
+        params['network__in'] = ",".join(networks)
+        print(f"   Filtre API network: {params['network__in']}")
+
+    if countries:
+        codes = country_codes(countries)
+        if codes:
+            params['country_code__in'] = ",".join(codes)
+            print(f"   Filtre API pays: {params['country_code__in']}")
+        else:
+            print(f"   ⚠️  Pays non mappés ({', '.join(countries)}), filtre pays local uniquement")
+
+    return params
+
+
+class _CountingReader(io.RawIOBase):
+    """
+    Compte les octets décompressés lus depuis la réponse HTTP.
+
+    Avec decode_content=True, urllib3 1.x peut renvoyer plus d'octets que
+    demandé : l'excédent est gardé pour les lectures suivantes.
+    """
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.bytes_read = 0
+        self._pending = b""
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        size = len(buffer)
+        data = self._pending or self.raw.read(size)
+        n = min(len(data), size)
+        buffer[:n] = data[:n]
+        self._pending = data[n:]
+        self.bytes_read += n
+        return n
+
+
+def format_transfer(compressed_bytes: int, uncompressed_bytes: int) -> str:
+    """Ex: '1.2 Mo transférés / 9.8 Mo CSV (-88%)'"""
+    saving = 1 - compressed_bytes / uncompressed_bytes if uncompressed_bytes else 0
+    return (
+        f"{compressed_bytes / 1e6:.1f} Mo transférés / "
+        f"{uncompressed_bytes / 1e6:.1f} Mo CSV (-{saving:.0%})"
+    )
+
+
+def add_app_token_dimension(dimensions: str) -> tuple:
+    """Ajoute la dimension app_token si absente. Retourne (dimensions, ajoutée ?)."""
+    dims = dimensions.split(",")
+    if "app_token" in dims:
+        return dimensions, False
+    return ",".join(dims + ["app_token"]), True
+
+
+def split_by_app_token(
+    df: pd.DataFrame,
+    app_tokens: list,
+    drop_column: bool = True,
+    token_col: str = APP_TOKEN_COLUMN
+) -> dict:
+    """
+    Démultiplexe un rapport multi-apps en un DataFrame par app_token.
+
+    Les apps sans aucune ligne reçoivent un DataFrame vide (mêmes colonnes).
+    L'ordre des lignes (tri par 'Day (date)') est conservé dans chaque partie.
+    Lève ValueError si la colonne token_col est absente de la réponse.
+    """
+    if token_col not in df.columns:
+        raise ValueError(
+            f"Colonne '{token_col}' absente de la réponse Adjust (dimension app_token demandée): "
+            f"{list(df.columns)}"
+        )
+
+    # observed=True : la colonne est category, seuls les tokens présents forment un groupe
+    groups = dict(tuple(df.groupby(token_col, sort=False, observed=True)))
+    frames = {}
+    for app_token in app_tokens:
+        part = groups.get(app_token)
+        if part is None:
+            print(f"   ⚠️  App {app_token}: aucune ligne dans la réponse batch")
+            part = df.iloc[0:0]
+        frames[app_token] = part.drop(columns=token_col) if drop_column else part
+    return frames
+
+
+def parse_retry_after(value: str):
+    """Retry-After en secondes (entier ou date HTTP), None si absent/illisible."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    Token bucket thread-safe à débit adaptatif (AIMD).
+
+    Le débit monte progressivement jusqu'à max_rate tant que les requêtes
+    passent, est divisé par 2 à chaque 429, et pause() bloque tous les
+    threads jusqu'à la fin d'un Retry-After.
+    """
+
+    def __init__(
+        self,
+        rate: float = DEFAULT_RATE_PER_SECOND,
+        burst: int = DEFAULT_BURST,
+        max_rate: float = DEFAULT_MAX_RATE_PER_SECOND,
+        min_rate: float = 0.1
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Bloque jusqu'à obtenir un jeton."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                else:
+                    self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+                    self.updated_at = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + 0.1)
+
+    def on_throttled(self):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+
+
+# =============================================================================
+# CLIENT
+# =============================================================================
+
+class AdjustClient:
+    """
+    Client Adjust avec Session poolée (keep-alive).
+
+    Args:
+        api_token: Token API Adjust (Bearer)
+        pool_connections: Nombre de pools d'hôtes gardés en cache
+        pool_maxsize: Connexions simultanées max vers un même hôte
+        keep_alive: Si False, ferme la connexion après chaque requête
+        timeout: Timeout HTTP en secondes
+        compress: Si True, négocie gzip/deflate/br (ACCEPT_ENCODING)
+        cache: AdjustCache optionnel pour les réponses de fetch_report
+        rate_limiter: TokenBucket partagé par toutes les requêtes du client
+        max_retries: Nombre max de retries par requête (429, 5xx, réseau)
+
+    Attributs:
+        transfer_stats: Cumul des requêtes et octets compressés / décompressés
+    """
+
+    def __init__(
+        self,
+        api_token: str,
+        pool_connections: int = DEFAULT_POOL_CONNECTIONS,
+        pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+        keep_alive: bool = True,
+        timeout: int = DEFAULT_TIMEOUT,
+        compress: bool = True,
+        cache: AdjustCache = None,
+        rate_limiter: TokenBucket = None,
+        max_retries: int = DEFAULT_MAX_RETRIES
+    ):
+        self.api_token = api_token
+        self.pool_maxsize = pool_maxsize
+        self.timeout = timeout
+        self.cache = cache
+        self.rate_limiter = rate_limiter or TokenBucket()
+        self.max_retries = max_retries
+        self.request_count = 0
+        self.retry_count = 0
+        self.transfer_stats = {"requests": 0, "compressed_bytes": 0, "uncompressed_bytes": 0}
+        self._stats_lock = threading.Lock()
+
+        self.session = requests.Session()
+        # pool_block=True : au-delà de pool_maxsize, les threads attendent une
+        # connexion libre au lieu d'en ouvrir une nouvelle (limite par hôte)
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=True
+        )
+        self.session.mount("https://", adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {api_token}",
+            "Connection": "keep-alive" if keep_alive else "close",
+            "Accept-Encoding": ACCEPT_ENCODING if compress else "identity"
+        })
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Ferme les connexions du pool."""
+        self.session.close()
+
+    def _record_transfer(self, compressed_bytes: int, uncompressed_bytes: int):
+        with self._stats_lock:
+            self.transfer_stats["requests"] += 1
+            self.transfer_stats["compressed_bytes"] += compressed_bytes
+            self.transfer_stats["uncompressed_bytes"] += uncompressed_bytes
+
+    def take_retry_budget(self) -> bool:
+        """Consomme un retry si le budget du client le permet."""
+        with self._stats_lock:
+            budget = RETRY_BUDGET_MIN + RETRY_BUDGET_RATIO * self.request_count
+            if self.retry_count >= budget:
+                return False
+            self.retry_count += 1
+            return True
+
+    def throttle(self):
+        """Attend un jeton du token bucket et compte la requête dans le budget de retries."""
+        self.rate_limiter.acquire()
+        with self._stats_lock:
+            self.request_count += 1
+
+    def backoff_delay(self, status_code: int, retry_after: float, attempt: int) -> float:
+        """
+        Délai avant le prochain retry.
+
+        Retry-After s'il est fourni, sinon backoff exponentiel avec full jitter
+        (évite que les requêtes relancent toutes en même temps). Sur un 429,
+        réduit le débit du token et le met en pause pour toutes les requêtes.
+        """
+        if retry_after is not None:
+            delay = min(retry_after, BACKOFF_MAX_SECONDS) + random.uniform(0, 1)
+        else:
+            delay = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+        if status_code == 429:
+            self.rate_limiter.on_throttled()
+            self.rate_limiter.pause(delay)
+        return delay
+
+    def _get(self, params: dict, stream: bool = False):
+        """
+        GET csv_report derrière le token bucket, avec retries.
+
+        Retry sur 429/5xx et erreurs réseau (voir backoff_delay), dans la
+        limite du budget de retries du client. Retourne la dernière réponse
+        (éventuellement en erreur) quand les retries sont épuisés.
+        """
+        for attempt in range(self.max_retries + 1):
+            self.throttle()
+
+            try:
+                response = self.session.get(
+                    ADJUST_REPORT_ENDPOINT, params=params, timeout=self.timeout, stream=stream
+                )
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.max_retries or not self.take_retry_budget():
+                    raise
+                delay = self.backoff_delay(None, None, attempt)
+                print(f"   ⚠️  Erreur réseau ({e.__class__.__name__}), retry dans {delay:.1f}s")
+                time.sleep(delay)
+                continue
+
+            if response.status_code not in RETRYABLE_STATUS:
+                self.rate_limiter.on_success()
+                return response
+
+            if attempt == self.max_retries or not self.take_retry_budget():
+                return response
+
+            delay = self.backoff_delay(
+                response.status_code, parse_retry_after(response.headers.get("Retry-After")), attempt
+            )
+            print(f"   ⚠️  HTTP {response.status_code} ({params['date_period']}), "
+                  f"retry {attempt + 1}/{self.max_retries} dans {delay:.1f}s")
+            response.close()
+            time.sleep(delay)
+
+    def _raise_api_error(self, response, params: dict):
+        print(f"❌ Erreur API ({params['date_period']}): {response.status_code}")
+        print(response.text)
+        raise ValueError(f"Failed to retrieve data: {response.status_code}")
+
+    def fetch_report(self, params: dict, chunksize: int = None) -> pd.DataFrame:
+        """
+        Envoie une requête csv_report et retourne le DataFrame brut (non trié).
+
+        Si chunksize est fourni, le corps est lu en streaming (voir
+        stream_report) au lieu d'être chargé en entier en mémoire.
+        Passe par le cache disque si le client en a un.
+        """
+        if self.cache is not None:
+            df = self.cache.get(params)
+            if df is not None:
+                return df
+
+        if chunksize:
+            # Les catégories diffèrent d'un chunk à l'autre → schéma réappliqué après concat
+            df = apply_schema(pd.concat(self.stream_report(params, chunksize), ignore_index=True))
+        else:
+            response = self._get(params)
+
+            if response.status_code != 200:
+                self._raise_api_error(response, params)
+
+            # raw.tell() = octets reçus sur le réseau (avant décompression)
+            self._record_transfer(response.raw.tell(), len(response.content))
+            df = read_adjust_csv(io.BytesIO(response.content))
+
+        if self.cache is not None:
+            self.cache.put(params, df)
+        return df
+
+    def stream_report(self, params: dict, chunksize: int = DEFAULT_CHUNKSIZE, dtype: dict = None):
+        """
+        Lit un csv_report en streaming et yield des DataFrames de chunksize lignes.
+
+        Le corps HTTP est parsé au fil de l'eau : la mémoire ne dépend que de
+        chunksize, pas de la taille du rapport. Chaque chunk est typé via
+        adjust_schema, sauf si un dtype explicite (colonne → type) est passé.
+        """
+        with self._get(params, stream=True) as response:
+            if response.status_code != 200:
+                self._raise_api_error(response, params)
+
+            # Décompression gzip/deflate/br par urllib3 au fil de la lecture,
+            # directement dans le parser CSV
+            response.raw.decode_content = True
+            counter = _CountingReader(response.raw)
+            try:
+                with pd.read_csv(io.BufferedReader(counter), chunksize=chunksize, dtype=dtype) as reader:
+                    for chunk in reader:
+                        yield chunk if dtype is not None else apply_schema(chunk)
+            finally:
+                self._record_transfer(response.raw.tell(), counter.bytes_read)
+
+    def iter_report(
+        self,
+        app_token: str,
+        begin_date: str,
+        end_date: str,
+        chunksize: int = DEFAULT_CHUNKSIZE,
+        dtype: dict = None,
+        **report_kwargs
+    ):
+        """
+        Version streaming de pull : yield les chunks bruts au fil du téléchargement.
+
+        report_kwargs: mêmes arguments que build_report_params (dimensions,
+        metrics, events, ...). Les chunks ne sont ni triés ni dédoublonnés.
+        """
+        print(f"📥 Pull Adjust (streaming): {begin_date} → {end_date}")
+        params = build_report_params(app_token, begin_date, end_date, **report_kwargs)
+
+        stats_before = dict(self.transfer_stats)
+        total = 0
+        for chunk in self.stream_report(params, chunksize=chunksize, dtype=dtype):
+            total += len(chunk)
+            yield chunk
+        print(f"   {total} lignes streamées")
+        print("   📦 " + format_transfer(
+            self.transfer_stats["compressed_bytes"] - stats_before["compressed_bytes"],
+            self.transfer_stats["uncompressed_bytes"] - stats_before["uncompressed_bytes"]
+        ))
+
+    def pull(
+        self,
+        app_token: str,
+        begin_date: str,
+        end_date: str,
+        adjust_account_id: str = None,
+        dimensions: str = "day,country,network,campaign,creative,adgroup",
+        metrics: str = None,
+        include_revenue: bool = False,
+        events: list = None,
+        store_id: str = None,
+        networks: list = None,
+        countries: list = None,
+        shard: str = None,
+        max_workers: int = 4,
+        chunksize: int = None
+    ) -> pd.DataFrame:
+        """
+        Pull les données depuis l'API Adjust (mêmes arguments que pull_from_adjust).
+
+        En mode shard, max_workers est plafonné à pool_maxsize pour que
+        chaque thread réutilise une connexion du pool.
+        """
+        def fetch(report_params: dict) -> pd.DataFrame:
+            return self.fetch_report(report_params, chunksize=chunksize)
+
+        def fetch_window(window: tuple) -> pd.DataFrame:
+            # Toutes les fenêtres partagent l'utc_offset de params : l'API découpe
+            # les jours dans ce fuseau, donc les fenêtres sont disjointes et aucun
+            # dédoublonnage n'est nécessaire. Une ligne hors fenêtre serait un
+            # artefact de frontière : elle est écartée, jamais fusionnée.
+            window_begin, window_end = window
+            df = fetch({**params, "date_period": f"{window_begin}:{window_end}"})
+            in_window = pd.to_datetime(df['Day (date)']).between(
+                pd.Timestamp(window_begin), pd.Timestamp(window_end)
+            )
+            if not in_window.all():
+                print(f"   🧹 {int((~in_window).sum())} lignes hors fenêtre {window_begin} → {window_end} écartées")
+                df = df[in_window]
+            return df
+
+        print(f"📥 Pull Adjust: {begin_date} → {end_date}")
+
+        params = build_report_params(
+            app_token=app_token,
+            begin_date=begin_date,
+            end_date=end_date,
+            adjust_account_id=adjust_account_id,
+            dimensions=dimensions,
+            metrics=metrics,
+            include_revenue=include_revenue,
+            events=events,
+            store_id=store_id,
+            networks=networks,
+            countries=countries
+        )
+
+        # Snapshot pour afficher le transfert de ce pull uniquement
+        stats_before = dict(self.transfer_stats)
+
+        # Sans dimension "day", découper la période fausserait les agrégats
+        if shard and "day" not in dimensions.split(","):
+            print(f"   ⚠️  Pas de dimension 'day', shard '{shard}' ignoré")
+            shard = None
+
+        if shard:
+            windows = split_date_range(begin_date, end_date, shard)
+            max_workers = min(max_workers, self.pool_maxsize)
+            print(f"   🧩 {len(windows)} fenêtres '{shard}' ({max_workers} requêtes max en parallèle)")
+
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                frames = list(executor.map(fetch_window, windows))
+
+            df = pd.concat(frames, ignore_index=True)
+        else:
+            df = fetch(params)
+
+        print("✅ Données récupérées avec succès")
+        df = df.sort_values('Day (date)', kind='stable')
+        print(f"   {len(df)} lignes récupérées")
+        print("   📦 " + format_transfer(
+            self.transfer_stats["compressed_bytes"] - stats_before["compressed_bytes"],
+            self.transfer_stats["uncompressed_bytes"] - stats_before["uncompressed_bytes"]
+        ))
+        return df
+
+    def pull_batch(
+        self,
+        app_tokens: list,
+        begin_date: str,
+        end_date: str,
+        dimensions: str = DEFAULT_DIMENSIONS,
+        **pull_kwargs
+    ) -> dict:
+        """
+        Pull plusieurs apps du même compte en UNE requête (app_token__in).
+
+        Ajoute la dimension app_token le temps de la requête puis redécoupe
+        le résultat par app : chaque DataFrame est identique à un pull()
+        de l'app seule.
+
+        Returns:
+            dict app_token → DataFrame
+        """
+        dimensions, added = add_app_token_dimension(dimensions)
+        print(f"   📦 Batch de {len(app_tokens)} apps: {', '.join(app_tokens)}")
+
+        df = self.pull(
+            app_token=",".join(app_tokens),
+            begin_date=begin_date,
+            end_date=end_date,
+            dimensions=dimensions,
+            **pull_kwargs
+        )
+        return split_by_app_token(df, app_tokens, drop_column=added)
+
+
+# Un client partagé par token API (réutilisé par tous les scripts du process)
+_CLIENTS = {}
+
+
+def get_adjust_client(api_token: str, **client_kwargs) -> AdjustClient:
+    """
+    Retourne le client partagé pour ce token API (créé au premier appel).
+
+    Les client_kwargs (pool_maxsize, keep_alive, cache, ...) ne sont pris en
+    compte qu'à la création du client. Par défaut le client utilise le cache
+    disque partagé (get_default_cache) ; passer cache=None pour le désactiver.
+    """
+    client = _CLIENTS.get(api_token)
+    if client is None:
+        client_kwargs.setdefault("cache", get_default_cache())
+        client = AdjustClient(api_token, **client_kwargs)
+        _CLIENTS[api_token] = client
+    return client
@@ -11,14 +11,16 @@ Usage:
 import pandas as pd
 from datetime import date, timedelta
 import gspread
-from gspread_dataframe import set_with_dataframe
 import argparse
 
 from adjust_to_gsheet import (
     get_gspread_client,
-    pull_from_adjust,
     ADJUST_API_TOKEN
 )
+from adjust_client import get_adjust_client
+from adjust_transform import format_date_column, AllocationTracker, TRANSFORM_DEBUG
+from adjust_upsert import row_keys
+from adjust_sheet_io import write_sheet_diff, append_if_newer
 
 # =============================================================================
 # CONFIGURATION FDJ
@@ -65,14 +67,8 @@ FDJ_CPA = 27.0  # Euros
 # TRANSFORMATION FDJ
 # =============================================================================
 
-def transform_fdj_data(df: pd.DataFrame) -> pd.DataFrame:
-    """
-    Transformation simple pour FDJ
-    """
-    print("🔄 Transformation FDJ...")
-    
-    tmp = df.copy()
-    
+def _transform_fdj(df: pd.DataFrame, backend: str, tracker: AllocationTracker) -> pd.DataFrame:
+    """Sélection / renommage, colonnes calculées et dates (df n'est pas modifié)."""
     # Mapping des colonnes Adjust vers colonnes FDJ
     column_mapping = {
         'Network (attribution)': 'Network',
@@ -81,28 +77,48 @@ def transform_fdj_data(df: pd.DataFrame) -> pd.DataFrame:
         'Adspend': 'Ad spend',
         'In-app revenue': 'In-app revenue'
     }
+    source_of = {new_col: old_col for old_col, new_col in column_mapping.items() if old_col in df.columns}
     
-    for old_col, new_col in column_mapping.items():
-        if old_col in tmp.columns:
-            tmp.rename(columns={old_col: new_col}, inplace=True)
-    
-    # Garde uniquement les colonnes qui existent
-    existing_cols = [col for col in FDJ_COLUMNS if col in tmp.columns]
-    tmp = tmp[existing_cols]
+    # Garde uniquement les colonnes qui existent : une seule sélection, puis renommage
+    with tracker.step("select"):
+        selected = [(source_of.get(col, col), col) for col in FDJ_COLUMNS
+                    if col in source_of or col in df.columns]
+        tmp = df[[old_col for old_col, _ in selected]]
+        tmp.columns = [new_col for _, new_col in selected]
     
     # Ajoute les colonnes calculées
-    tmp['CPA'] = FDJ_CPA
+    with tracker.step("cpa"):
+        tmp['CPA'] = FDJ_CPA
+        
+        # Budget dépensé = CPA * inscription_confirmation_events
+        if 'inscription_confirmation_events' in tmp.columns:
+            tmp['Budget dépensé'] = tmp['CPA'] * tmp['inscription_confirmation_events']
+        else:
+            tmp['Budget dépensé'] = 0.0
+    
+    with tracker.step("dates"):
+        # Format dates sans timestamp
+        for date_col in ['Day (date)', 'Week (date)', 'Month (date)']:
+            if date_col in tmp.columns:
+                tmp[date_col] = format_date_column(tmp[date_col], backend=backend)
+    return tmp
+
+
+def transform_fdj_data(df: pd.DataFrame, backend: str = None, debug: bool = None) -> pd.DataFrame:
+    """
+    Transformation simple pour FDJ
     
-    # Budget dépensé = CPA * inscription_confirmation_events
-    if 'inscription_confirmation_events' in tmp.columns:
-        tmp['Budget dépensé'] = tmp['CPA'] * tmp['inscription_confirmation_events']
-    else:
-        tmp['Budget dépensé'] = 0.0
+    Args:
+        backend: "pandas" ou "polars" pour le formatage des dates
+                 (défaut: ADJUST_TRANSFORM_BACKEND, voir adjust_transform)
+        debug: Affiche les octets alloués par étape (défaut: ADJUST_TRANSFORM_DEBUG=1)
+    """
+    print("🔄 Transformation FDJ...")
     
-    # Format dates sans timestamp
-    for date_col in ['Day (date)', 'Week (date)', 'Month (date)']:
-        if date_col in tmp.columns:
-            tmp[date_col] = pd.to_datetime(tmp[date_col]).dt.strftime('%Y-%m-%d')
+    tracker = AllocationTracker(TRANSFORM_DEBUG if debug is None else debug)
+    with tracker:
+        tmp = _transform_fdj(df, backend, tracker)
+    tracker.report()
     
     print(f"   ✅ {len(tmp)} lignes transformées")
     
@@ -144,6 +160,13 @@ def smart_push_fdj(df: pd.DataFrame, config: dict, gc: gspread.Client):
     try:
         wks = gc.open_by_key(config["sheet_id"])
         sheet = wks.worksheet(config["sheet_name"])
+        url = f"https://docs.google.com/spreadsheets/d/{config['sheet_id']}"
+        
+        # Uniquement des jours plus récents que le sheet → ajout en fin, sans relire l'historique
+        if append_if_newer(sheet, df):
+            print(f"   ➕ {len(df)} lignes ajoutées")
+            print(f"   ✅ Push réussi: {url}")
+            return
         
         # Lit le sheet existant
         try:
@@ -155,8 +178,7 @@ def smart_push_fdj(df: pd.DataFrame, config: dict, gc: gspread.Client):
         
         if len(existing) == 0:
             # Sheet vide → push complet
-            sheet.clear()
-            set_with_dataframe(sheet, df)
+            write_sheet_diff(sheet, df, previous=existing)
             print(f"   ✅ {len(df)} lignes ajoutées")
         else:
             # Merge intelligent
@@ -165,28 +187,23 @@ def smart_push_fdj(df: pd.DataFrame, config: dict, gc: gspread.Client):
             
             # Vérifie que les colonnes clés existent
             if all(col in df.columns for col in key_cols):
-                # Crée une clé composite
-                df['_key'] = df[key_cols].astype(str).agg('_'.join, axis=1)
-                existing['_key'] = existing[key_cols].astype(str).agg('_'.join, axis=1)
+                # Clé uint64 par ligne (hash vectorisé des dimensions)
+                existing_keys, new_keys = row_keys(existing, df, key_cols)
                 
                 # Supprime les lignes existantes qui matchent
-                existing_clean = existing[~existing['_key'].isin(df['_key'])]
+                existing_clean = existing[~pd.Index(existing_keys).isin(new_keys)]
                 
                 # Combine
                 result = pd.concat([existing_clean, df], ignore_index=True)
                 
-                # Retire la colonne temporaire
-                result = result.drop(columns=['_key'])
-                
-                # Trie par date
+                # Trie par date (tri stable : les lignes existantes gardent leur place)
                 if 'Day (date)' in result.columns:
-                    result = result.sort_values('Day (date)')
+                    result = result.sort_values('Day (date)', kind='stable')
                 
-                # Push
-                sheet.clear()
-                set_with_dataframe(sheet, result)
+                # Push différentiel : seules les cellules modifiées sont écrites
+                write_sheet_diff(sheet, result, previous=existing)
                 
-                nb_updated = len(df[df['_key'].isin(existing['_key'])])
+                nb_updated = int(pd.Index(new_keys).isin(existing_keys).sum())
                 nb_added = len(df) - nb_updated
                 
                 print(f"   🔄 {nb_updated} lignes mises à jour")
@@ -194,11 +211,9 @@ def smart_push_fdj(df: pd.DataFrame, config: dict, gc: gspread.Client):
             else:
                 # Fallback: append simple
                 result = pd.concat([existing, df], ignore_index=True)
-                sheet.clear()
-                set_with_dataframe(sheet, result)
+                write_sheet_diff(sheet, result, previous=existing)
                 print(f"   ➕ {len(df)} lignes ajoutées")
         
-        url = f"https://docs.google.com/spreadsheets/d/{config['sheet_id']}"
         print(f"   ✅ Push réussi: {url}")
         
     except Exception as e:
@@ -241,7 +256,7 @@ def run_fdj_pipeline(target_date: str = None):
         metrics = "installs,clicks,impressions,cost,revenue"
         
         # Récupère TOUS les événements (pas de filtre)
-        df = pull_from_adjust(
+        df = get_adjust_client(ADJUST_API_TOKEN).pull(
             app_token=FDJ_CONFIG["app_token"],
             begin_date=target_date,
             end_date=target_date,
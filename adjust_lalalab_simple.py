@@ -14,15 +14,16 @@ import re
 import json
 from datetime import date, timedelta
 import gspread
-from gspread_dataframe import set_with_dataframe, get_as_dataframe
 import argparse
 
 from adjust_to_gsheet import (
     get_gspread_client,
-    pull_from_adjust,
     transform_data,
-    ADJUST_API_TOKEN
+    build_pushdown_filters
 )
+from adjust_client import get_adjust_client
+from adjust_upsert import upsert, common_columns, SHEET_JOIN_KEYS, REVENUE_COLUMNS
+from adjust_sheet_io import read_sheet_rows, read_sheet_window, write_sheet_diff, append_if_newer
 
 # =============================================================================
 # CONFIGURATION
@@ -102,7 +103,10 @@ def load_lalalab_config(gc: gspread.Client, client_name: str) -> dict:
             "App", "Month (date)", "Week (date)", "Day (date)",
             "Network (attribution)", "Country",
             "Campaign (attribution)", "Adgroup (attribution)", "Creative (attribution)"
-        ]
+        ],
+        # Plafond optionnel : top K campagne/adgroup/créa par jour/pays (vide = pas de plafond)
+        "top_k": row.get('top_k', ''),
+        "top_k_metric": row.get('top_k_metric', '')
     }
     
     print(f"✅ Config chargée: {config['client']}")
@@ -114,24 +118,26 @@ def load_lalalab_config(gc: gspread.Client, client_name: str) -> dict:
 # =============================================================================
 
 def read_existing_sheet(config: dict, gc: gspread.Client) -> pd.DataFrame:
-    """Lit le contenu actuel du Google Sheet"""
+    """
+    Lit le contenu actuel du Google Sheet, tel quel (lignes vides retirées).
+    
+    C'est la base du push différentiel (write_sheet_diff) : les colonnes
+    vides sont à retirer par l'appelant (prepare_existing).
+    """
     try:
         wks = gc.open_by_key(config["sheet_id"])
         sheet = wks.worksheet(config["sheet_name"])
-        df = get_as_dataframe(sheet, evaluate_formulas=True)
-        
-        # Supprime les lignes/colonnes vides
-        df = df.dropna(how='all').dropna(axis=1, how='all')
-        
-        if 'Day (date)' in df.columns:
-            df['Day (date)'] = pd.to_datetime(df['Day (date)'])
-        
-        return df
+        return read_sheet_rows(sheet)
     except Exception as e:
         print(f"⚠️  Sheet vide ou erreur lecture: {e}")
         return pd.DataFrame()
 
 
+def prepare_existing(df_previous: pd.DataFrame) -> pd.DataFrame:
+    """Contenu lu du sheet → DataFrame de travail (colonnes vides retirées)."""
+    return df_previous.dropna(axis=1, how='all')
+
+
 def smart_push_daily(df_new: pd.DataFrame, config: dict, gc: gspread.Client):
     """
     Push intelligent :
@@ -140,16 +146,23 @@ def smart_push_daily(df_new: pd.DataFrame, config: dict, gc: gspread.Client):
     """
     print(f"📤 Push intelligent vers Google Sheet...")
     
-    # 1. Lit le sheet existant
-    df_existing = read_existing_sheet(config, gc)
+    wks = gc.open_by_key(config["sheet_id"])
+    sheet = wks.worksheet(config["sheet_name"])
+    
+    # 0. Uniquement des jours plus récents que le sheet → ajout en fin, sans relire l'historique
+    df_new['Day (date)'] = pd.to_datetime(df_new['Day (date)']).dt.strftime('%Y-%m-%d')
+    if append_if_newer(sheet, df_new):
+        print(f"✅ {len(df_new)} lignes ajoutées")
+        return
+    
+    # 1. Lit le sheet existant (df_previous : contenu tel quel, base du push différentiel)
+    df_previous = read_existing_sheet(config, gc)
+    df_existing = prepare_existing(df_previous)
     
     if df_existing.empty:
         # Sheet vide → push complet
         print("   📝 Sheet vide, push complet")
-        wks = gc.open_by_key(config["sheet_id"])
-        sheet = wks.worksheet(config["sheet_name"])
-        sheet.clear()
-        set_with_dataframe(sheet, df_new)
+        write_sheet_diff(sheet, df_new, previous=df_previous)
         print(f"✅ {len(df_new)} lignes ajoutées")
         return
     
@@ -158,72 +171,29 @@ def smart_push_daily(df_new: pd.DataFrame, config: dict, gc: gspread.Client):
     df_new['Day (date)'] = pd.to_datetime(df_new['Day (date)']).dt.strftime('%Y-%m-%d')
     
     # 3. Clés de jointure (dimensions)
-    join_keys = [
-        'App', 'Month (date)', 'Week (date)', 'Day (date)',
-        'Network (attribution)', 'Country',
-        'Campaign (attribution)', 'Adgroup (attribution)', 'Creative (attribution)'
-    ]
-    join_keys = [k for k in join_keys if k in df_existing.columns and k in df_new.columns]
+    join_keys = common_columns(SHEET_JOIN_KEYS, df_existing, df_new)
     
     # 4. Colonnes revenues à mettre à jour
-    revenue_cols = ['0D All revenue total', '7D All revenue total', '30D All revenue total']
-    revenue_cols = [c for c in revenue_cols if c in df_existing.columns and c in df_new.columns]
+    revenue_cols = common_columns(REVENUE_COLUMNS, df_existing, df_new)
     
     print(f"   🔑 Clés de jointure: {', '.join(join_keys)}")
     print(f"   💰 Colonnes revenues: {', '.join(revenue_cols)}")
     
-    # 5. Créer une clé unique pour le merge
-    for df_temp in [df_existing, df_new]:
-        df_temp['_merge_key'] = df_temp[join_keys].astype(str).agg('||'.join, axis=1)
-    
-    # 6. Identifier les lignes existantes vs nouvelles
-    existing_keys = set(df_existing['_merge_key'])
-    new_keys = set(df_new['_merge_key'])
-    
-    keys_to_update = existing_keys & new_keys  # Lignes à mettre à jour
-    keys_to_add = new_keys - existing_keys      # Nouvelles lignes
-    
-    print(f"   🔄 Lignes à mettre à jour (revenues): {len(keys_to_update)}")
-    print(f"   ➕ Nouvelles lignes à ajouter: {len(keys_to_add)}")
-    
-    # 7. Créer un dict des nouvelles revenues
-    revenue_dict = {}
-    for _, row in df_new.iterrows():
-        key = row['_merge_key']
-        revenue_dict[key] = {col: row[col] for col in revenue_cols}
-    
-    # 8. Mettre à jour les revenues dans df_existing
-    updated_count = 0
-    for idx, row in df_existing.iterrows():
-        key = row['_merge_key']
-        if key in keys_to_update:
-            for col in revenue_cols:
-                df_existing.at[idx, col] = revenue_dict[key][col]
-            updated_count += 1
+    # 5. Upsert vectorisé : revenues remplacées sur les lignes existantes, nouvelles lignes à ajouter
+    df_existing, df_to_add, updated_count, added_count = upsert(df_existing, df_new, join_keys, revenue_cols)
     
     print(f"   ✅ {updated_count} lignes mises à jour (revenues)")
     
-    # 9. Ajouter les nouvelles lignes
-    df_to_add = df_new[df_new['_merge_key'].isin(keys_to_add)].copy()
-    
-    if len(df_to_add) > 0:
-        # Supprimer _merge_key avant d'ajouter
-        df_to_add = df_to_add.drop('_merge_key', axis=1)
-        df_existing = df_existing.drop('_merge_key', axis=1)
-        
+    # 6. Ajouter les nouvelles lignes
+    if added_count > 0:
         df_final = pd.concat([df_existing, df_to_add], ignore_index=True)
-        print(f"   ➕ {len(df_to_add)} nouvelles lignes ajoutées")
+        print(f"   ➕ {added_count} nouvelles lignes ajoutées")
     else:
-        df_existing = df_existing.drop('_merge_key', axis=1)
         df_final = df_existing
     
-    # 10. Trier par date et push
-    df_final = df_final.sort_values('Day (date)')
-    
-    wks = gc.open_by_key(config["sheet_id"])
-    sheet = wks.worksheet(config["sheet_name"])
-    sheet.clear()
-    set_with_dataframe(sheet, df_final)
+    # 7. Trier par date (tri stable : les lignes existantes gardent leur place) et push différentiel
+    df_final = df_final.sort_values('Day (date)', kind='stable')
+    write_sheet_diff(sheet, df_final, previous=df_previous)
     
     print(f"✅ Push réussi: {len(df_final)} lignes totales")
 
@@ -242,23 +212,20 @@ def update_revenues_30d(config: dict, gc: gspread.Client):
     
     print(f"📥 Pull Adjust: {begin_date} → {end_date}")
     
-    # Utilise l'API token du client
-    import adjust_to_gsheet
-    original_token = adjust_to_gsheet.ADJUST_API_TOKEN
-    adjust_to_gsheet.ADJUST_API_TOKEN = config['api_token']
+    # Utilise le client Adjust partagé du token API du client
+    adjust_client = get_adjust_client(config['api_token'])
     
-    df_new = pull_from_adjust(
+    df_new = adjust_client.pull(
         app_token=config["app_token"],
-        begin_date=begin_date,
         end_date=end_date,
         adjust_account_id=config["adjust_account_id"],
         dimensions="app,month,week,day,country,network,campaign,creative,adgroup",
         include_revenue=True,
-        events=config.get('events', [])
+        events=config.get('events', []),
+        # Filtres network / pays / start_date poussés dans la requête
+        **build_pushdown_filters(config, begin_date, end_date)
     )
     
-    adjust_to_gsheet.ADJUST_API_TOKEN = original_token
-    
     # 2. Transform (sans custom CPI pour ne pas recalculer Adspend)
     config_temp = config.copy()
     config_temp['custom_cpi'] = {}  # Skip CPI calculation
@@ -266,11 +233,16 @@ def update_revenues_30d(config: dict, gc: gspread.Client):
     
     print(f"   📊 {len(df_new)} lignes récupérées")
     
-    # 3. Lit le sheet existant
-    df_existing = read_existing_sheet(config, gc)
+    # 3. Lit uniquement la fenêtre du sheet (trié par date) couverte par le pull
+    wks = gc.open_by_key(config["sheet_id"])
+    sheet = wks.worksheet(config["sheet_name"])
+    df_previous, start_row = read_sheet_window(sheet, begin_date)
+    if df_previous is None:
+        df_previous = read_existing_sheet(config, gc)
+    df_existing = prepare_existing(df_previous)
     
     if df_existing.empty:
-        print("⚠️  Sheet vide, utilisez push quotidien d'abord")
+        print("⚠️  Aucune ligne existante sur la période, utilisez push quotidien d'abord")
         return
     
     # 4. Convertir les dates (format YYYY-MM-DD sans heure)
@@ -278,50 +250,23 @@ def update_revenues_30d(config: dict, gc: gspread.Client):
     df_new['Day (date)'] = pd.to_datetime(df_new['Day (date)']).dt.strftime('%Y-%m-%d')
     
     # 5. Clés de jointure
-    join_keys = [
-        'App', 'Month (date)', 'Week (date)', 'Day (date)',
-        'Network (attribution)', 'Country',
-        'Campaign (attribution)', 'Adgroup (attribution)', 'Creative (attribution)'
-    ]
-    join_keys = [k for k in join_keys if k in df_existing.columns and k in df_new.columns]
+    join_keys = common_columns(SHEET_JOIN_KEYS, df_existing, df_new)
     
     # 6. Colonnes revenues
-    revenue_cols = ['0D All revenue total', '7D All revenue total', '30D All revenue total']
-    revenue_cols = [c for c in revenue_cols if c in df_existing.columns and c in df_new.columns]
+    revenue_cols = common_columns(REVENUE_COLUMNS, df_existing, df_new)
     
     print(f"   💰 Update colonnes: {', '.join(revenue_cols)}")
     
-    # 7. Créer clés de merge
-    for df_temp in [df_existing, df_new]:
-        df_temp['_merge_key'] = df_temp[join_keys].astype(str).agg('||'.join, axis=1)
-    
-    # 8. Créer dict des revenues
-    revenue_dict = {}
-    for _, row in df_new.iterrows():
-        key = row['_merge_key']
-        revenue_dict[key] = {col: row[col] for col in revenue_cols}
-    
-    # 9. Update revenues dans df_existing
-    updated_count = 0
-    for idx, row in df_existing.iterrows():
-        key = row['_merge_key']
-        if key in revenue_dict:
-            for col in revenue_cols:
-                df_existing.at[idx, col] = revenue_dict[key][col]
-            updated_count += 1
+    # 7. Update revenues vectorisé (les lignes absentes du sheet ne sont pas ajoutées)
+    df_existing, _, updated_count, _ = upsert(df_existing, df_new, join_keys, revenue_cols)
     
     print(f"   ✅ {updated_count} lignes mises à jour")
     
-    # 10. Supprimer _merge_key et push
-    df_existing = df_existing.drop('_merge_key', axis=1)
-    df_existing = df_existing.sort_values('Day (date)')
+    # 8. Push différentiel (seulement la fenêtre si lecture partielle)
+    df_existing = df_existing.sort_values('Day (date)', kind='stable')
+    write_sheet_diff(sheet, df_existing, previous=df_previous, start_row=start_row or 2)
     
-    wks = gc.open_by_key(config["sheet_id"])
-    sheet = wks.worksheet(config["sheet_name"])
-    sheet.clear()
-    set_with_dataframe(sheet, df_existing)
-    
-    print(f"✅ Update revenues réussi: {len(df_existing)} lignes totales")
+    print(f"✅ Update revenues réussi: {len(df_existing)} lignes réécrites")
 
 
 def run_daily_pipeline(config: dict, target_date: str, gc: gspread.Client):
@@ -335,22 +280,19 @@ def run_daily_pipeline(config: dict, target_date: str, gc: gspread.Client):
     
     try:
         # 1. Pull Adjust pour la date
-        import adjust_to_gsheet
-        original_token = adjust_to_gsheet.ADJUST_API_TOKEN
-        adjust_to_gsheet.ADJUST_API_TOKEN = config['api_token']
+        adjust_client = get_adjust_client(config['api_token'])
         
-        df = pull_from_adjust(
+        df = adjust_client.pull(
             app_token=config["app_token"],
-            begin_date=target_date,
             end_date=target_date,
             adjust_account_id=config["adjust_account_id"],
             dimensions="app,month,week,day,country,network,campaign,creative,adgroup",
             include_revenue=True,
-            events=config.get('events', [])
+            events=config.get('events', []),
+            # Filtres network / pays / start_date poussés dans la requête
+            **build_pushdown_filters(config, target_date, target_date)
         )
         
-        adjust_to_gsheet.ADJUST_API_TOKEN = original_token
-        
         # 2. Transform avec CPI du config
         df = transform_data(df, config)
         
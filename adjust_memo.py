@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+ADJUST MEMO
+Mémoïsation en mémoire des résultats de transform_data
+
+Un même rapport brut passe plusieurs fois par transform_data dans un run
+(retries de push, re-run sans custom CPI, scripts qui enchaînent daily +
+revenues). Le résultat est gardé en mémoire :
+
+- clé = empreinte du contenu du DataFrame brut (valeurs, colonnes, dtypes)
+        + empreinte canonique de la config (ordre des clés indifférent)
+- budget mémoire : au-delà de max_size_mb, éviction LRU
+
+Le DataFrame retourné est une copie (superficielle en pandas >= 3 grâce au
+Copy-on-Write) : le modifier n'altère pas l'entrée mémoïsée.
+
+Usage:
+    from adjust_memo import get_default_memo
+    df = get_default_memo().get_or_compute(df_raw, config, lambda: plan.run(df_raw))
+"""
+
+import pandas as pd
+import numpy as np
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+# Budget mémoire des résultats mémoïsés (ADJUST_TRANSFORM_MEMO_MB=0 pour désactiver)
+DEFAULT_MEMO_MB = float(os.environ.get("ADJUST_TRANSFORM_MEMO_MB", 256))
+
+# pandas >= 3 : Copy-on-Write toujours actif → copie superficielle suffisante
+COPY_ON_WRITE = int(pd.__version__.split(".")[0]) >= 3
+
+
+# =============================================================================
+# EMPREINTES
+# =============================================================================
+
+def _hash_values(digest, values):
+    """Ajoute une colonne (ou un index) au digest sans conversion ligne par ligne."""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        # Codes (int8/int16) + catégories : la colonne entière n'est jamais matérialisée
+        digest.update(np.ascontiguousarray(values.cat.codes.to_numpy()).view(np.uint8))
+        values = pd.Series(values.cat.categories)
+    elif isinstance(values.dtype, np.dtype) and values.dtype.kind in "biufcmM":
+        # Numériques / dates : buffer numpy hashé tel quel
+        digest.update(np.ascontiguousarray(values.to_numpy()).view(np.uint8))
+        return
+    # Texte / object : un uint64 par valeur (vectorisé)
+    digest.update(pd.util.hash_pandas_object(values, index=False).to_numpy().view(np.uint8))
+
+
+def frame_fingerprint(df: pd.DataFrame) -> str:
+    """
+    Hash du contenu d'un DataFrame (valeurs + index + colonnes + dtypes).
+
+    Les buffers numpy sont hashés directement, les colonnes category via
+    leurs codes et leurs catégories (quelques dizaines de ms pour 1M lignes).
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for name, values in df.items():
+        digest.update(repr((name, str(values.dtype), len(values))).encode("utf-8"))
+        _hash_values(digest, values)
+
+    if isinstance(df.index, pd.RangeIndex):
+        digest.update(repr(df.index).encode("utf-8"))
+    else:
+        _hash_values(digest, pd.Series(df.index, copy=False))
+    return digest.hexdigest()
+
+
+def config_fingerprint(config: dict) -> str:
+    """Hash stable de la config (ordre des clés indifférent)."""
+    canonical = json.dumps(config, sort_keys=True, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+# =============================================================================
+# MEMO
+# =============================================================================
+
+class TransformMemo:
+    """
+    Résultats de transformation en mémoire, éviction LRU au-delà du budget.
+
+    Args:
+        max_size_mb: Taille max des DataFrames gardés (0 = désactivé)
+    """
+
+    def __init__(self, max_size_mb: float = DEFAULT_MEMO_MB):
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024)
+        self._entries = OrderedDict()  # clé → (DataFrame, taille)
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _copy(df: pd.DataFrame) -> pd.DataFrame:
+        return df.copy(deep=not COPY_ON_WRITE)
+
+    def get_or_compute(self, df: pd.DataFrame, config: dict, compute) -> pd.DataFrame:
+        """
+        Résultat mémoïsé pour (df, config), sinon compute() enregistré.
+
+        Args:
+            df: DataFrame brut en entrée de la transformation
+            config: Config du client (toutes les clés font partie de la clé)
+            compute: Fonction sans argument qui calcule le résultat
+        """
+        if self.max_size_bytes <= 0:
+            return compute()
+
+        key = (frame_fingerprint(df), config_fingerprint(config))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        if entry is not None:
+            print(f"   ⚡ Transformation mémoïsée ({config.get('client', '?')}): {len(entry[0])} lignes")
+            return self._copy(entry[0])
+
+        result = compute()
+        self.misses += 1
+        self.put(key, self._copy(result))
+        return result
+
+    def put(self, key: tuple, result: pd.DataFrame):
+        """Enregistre un résultat puis applique le budget mémoire."""
+        size = int(result.memory_usage(index=True, deep=True).sum())
+        if size > self.max_size_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._size -= self._entries.pop(key)[1]
+            self._entries[key] = (result, size)
+            self._size += size
+
+            # Du moins récemment utilisé au plus récent
+            evicted = 0
+            while self._size > self.max_size_bytes:
+                _, (_, old_size) = self._entries.popitem(last=False)
+                self._size -= old_size
+                evicted += 1
+
+        if evicted:
+            print(f"   🧹 Memo: {evicted} résultats évincés (limite {self.max_size_bytes / 1024 / 1024:.0f} Mo)")
+
+    def clear(self):
+        """Vide la mémoïsation."""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+_DEFAULT_MEMO = None
+
+
+def get_default_memo() -> TransformMemo:
+    """Memo partagé par défaut (budget ADJUST_TRANSFORM_MEMO_MB)."""
+    global _DEFAULT_MEMO
+    if _DEFAULT_MEMO is None:
+        _DEFAULT_MEMO = TransformMemo()
+    return _DEFAULT_MEMO
@@ -23,10 +23,14 @@ import pickle
 # Importe les fonctions depuis adjust_to_gsheet.py
 from adjust_to_gsheet import (
     get_gspread_client,
-    pull_from_adjust,
     transform_data,
-    push_to_gsheet
+    push_to_gsheet,
+    build_pushdown_filters
 )
+from adjust_client import get_adjust_client
+from adjust_async import prefetch_reports
+from adjust_watermark import WatermarkStore
+from adjust_parallel import transform_clients, transform_workers
 
 # =============================================================================
 # CONFIGURATION
@@ -203,13 +207,80 @@ def build_client_config(row: pd.Series) -> dict:
         "agg_columns": agg_columns,
         "repush_all": 'Lalalab' in row.get('client', ''),  # Repush complet pour Lalalab
         "group_by_most_spending_campaign": False,
-        "compute_ctr": False
+        "compute_ctr": False,
+        # Plafond optionnel : top K campagne/adgroup/créa par jour/pays (vide = pas de plafond)
+        "top_k": row.get('top_k', ''),
+        "top_k_metric": row.get('top_k_metric', '')
     }
     
     return config
 
 
-def run_client_pipeline(config: dict, begin_date: str, end_date: str, gc: gspread.Client):
+def build_pull_kwargs(config: dict, begin_date: str, end_date: str) -> dict:
+    """Arguments de pull Adjust pour un client (communs au pull séquentiel et asynchrone)."""
+    client_name = config['client']
+    include_revenue = "Lalalab" in client_name
+    
+    # Dimensions spécifiques pour LALALAB
+    if "Lalalab" in client_name:
+        dimensions = "app,month,week,day,country,network,campaign,creative,adgroup"
+    else:
+        dimensions = "day,country,network,campaign,creative,adgroup"
+    
+    return {
+        "app_token": config["app_token"],
+        "begin_date": begin_date,
+        "end_date": end_date,
+        "adjust_account_id": config.get("adjust_account_id"),
+        "dimensions": dimensions,
+        "include_revenue": include_revenue,
+        # Filtres network / pays / start_date poussés dans la requête
+        **build_pushdown_filters(config, begin_date, end_date)
+    }
+
+
+def load_raw_report(
+    config: dict,
+    begin_date: str,
+    end_date: str,
+    df_raw: pd.DataFrame = None,
+    watermarks: WatermarkStore = None
+) -> pd.DataFrame:
+    """
+    Rapport Adjust brut complet begin_date → end_date d'un client.
+    
+    Args:
+        df_raw: Rapport Adjust déjà téléchargé (prefetch_reports), sinon pull ici
+        watermarks: Si fourni, pull incrémental (df_raw couvre alors
+                    watermarks.fetch_begin → end_date)
+    """
+    pull_kwargs = build_pull_kwargs(config, begin_date, end_date)
+    fetch_begin = begin_date
+    if watermarks:
+        fetch_begin = watermarks.fetch_begin(config, begin_date, end_date, pull_kwargs)
+    
+    if df_raw is not None:
+        df = df_raw
+    else:
+        # Utilise le client Adjust partagé du token API spécifique du client
+        adjust_client = get_adjust_client(config['api_token'])
+        df = adjust_client.pull(**build_pull_kwargs(config, fetch_begin, end_date))
+    
+    # Fusion avec l'historique local (jours déjà matures)
+    if watermarks:
+        df = watermarks.merge(config, df, fetch_begin, begin_date, end_date, pull_kwargs)
+    return df
+
+
+def run_client_pipeline(
+    config: dict,
+    begin_date: str,
+    end_date: str,
+    gc: gspread.Client,
+    df_raw: pd.DataFrame = None,
+    watermarks: WatermarkStore = None,
+    df_transformed: pd.DataFrame = None
+):
     """
     Lance le pipeline pour un client spécifique.
     
@@ -218,6 +289,11 @@ def run_client_pipeline(config: dict, begin_date: str, end_date: str, gc: gsprea
         begin_date: Date de début
         end_date: Date de fin
         gc: Client gspread authentifié
+        df_raw: Rapport Adjust déjà téléchargé (prefetch_reports), sinon pull ici
+        watermarks: Si fourni, pull incrémental (df_raw couvre alors
+                    watermarks.fetch_begin → end_date)
+        df_transformed: Résultat déjà transformé (transform_many) : pull et
+                        transformation sont sautés
         
     Returns:
         True si succès, False si échec
@@ -230,34 +306,14 @@ def run_client_pipeline(config: dict, begin_date: str, end_date: str, gc: gsprea
     print(f"📅 Période: {begin_date} → {end_date}")
     
     try:
-        # 1. Pull Adjust
-        include_revenue = "Lalalab" in client_name
-        
-        # Dimensions spécifiques pour LALALAB
-        if "Lalalab" in client_name:
-            dimensions = "app,month,week,day,country,network,campaign,creative,adgroup"
+        if df_transformed is not None:
+            df = df_transformed
         else:
-            dimensions = "day,country,network,campaign,creative,adgroup"
-        
-        # Utilise l'API token spécifique du client
-        import adjust_to_gsheet
-        original_token = adjust_to_gsheet.ADJUST_API_TOKEN
-        adjust_to_gsheet.ADJUST_API_TOKEN = config['api_token']
-        
-        df = pull_from_adjust(
-            app_token=config["app_token"],
-            begin_date=begin_date,
-            end_date=end_date,
-            adjust_account_id=config.get("adjust_account_id"),
-            dimensions=dimensions,
-            include_revenue=include_revenue
-        )
-        
-        # Restaure le token original
-        adjust_to_gsheet.ADJUST_API_TOKEN = original_token
-        
-        # 2. Transform
-        df = transform_data(df, config)
+            # 1. Pull Adjust (sauf si déjà pré-téléchargé) + historique incrémental
+            df = load_raw_report(config, begin_date, end_date, df_raw=df_raw, watermarks=watermarks)
+            
+            # 2. Transform
+            df = transform_data(df, config)
         
         # 3. Affiche un aperçu
         print("\n📊 Aperçu des données:")
@@ -323,24 +379,66 @@ def main():
     for idx, row in active_clients.iterrows():
         print(f"   - {row.get('client', 'Unknown')}")
     
-    # 4. Lance le pipeline pour chaque client
+    # 4. Construit les configs
     results = {}
+    configs = []
     
     for idx, row in active_clients.iterrows():
         client_name = row.get('client', f'Client_{idx}')
         
-        # Construit la config
         config = build_client_config(row)
         if not config:
             print(f"⚠️  Configuration invalide pour {client_name}, skip")
             results[client_name] = False
             continue
-        
-        # Lance le pipeline
-        success = run_client_pipeline(config, begin_date, end_date, gc)
+        configs.append(config)
+    
+    # 5. Pré-télécharge tous les rapports (apps d'un même compte groupées, en parallèle si aiohttp)
+    #    En incrémental : chaque client ne re-télécharge que depuis son watermark
+    watermarks = WatermarkStore()
+    fetch_begins = {
+        config['client']: watermarks.fetch_begin(
+            config, begin_date, end_date, build_pull_kwargs(config, begin_date, end_date)
+        )
+        for config in configs
+    }
+    
+    def build_incremental_pull_kwargs(config: dict, begin_date: str, end_date: str) -> dict:
+        return build_pull_kwargs(config, fetch_begins[config['client']], end_date)
+    
+    prefetched = prefetch_reports(configs, begin_date, end_date, build_incremental_pull_kwargs)
+    
+    # 6. Transformations en parallèle (un process par client) si plusieurs cœurs
+    transformed = {}
+    if transform_workers(len(prefetched)) > 1:
+        raw_reports = {}
+        for config in configs:
+            client_name = config['client']
+            if client_name not in prefetched:
+                continue
+            try:
+                raw_reports[client_name] = load_raw_report(
+                    config, begin_date, end_date,
+                    df_raw=prefetched.pop(client_name),
+                    watermarks=watermarks
+                )
+            except Exception as e:
+                print(f"⚠️  {client_name}: historique incrémental en échec ({e}), retry séquentiel")
+        transformed = transform_clients(configs, raw_reports)
+        del raw_reports
+    
+    # 7. Lance le pipeline pour chaque client (push + export)
+    for config in configs:
+        client_name = config['client']
+        success = run_client_pipeline(
+            config, begin_date, end_date, gc,
+            df_raw=prefetched.get(client_name),
+            watermarks=watermarks,
+            df_transformed=transformed.pop(client_name, None)
+        )
         results[client_name] = success
     
-    # 5. Rapport final
+    # 8. Rapport final
     print("\n" + "=" * 60)
     print("📊 RAPPORT FINAL")
     print("=" * 60)
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+ADJUST PARALLEL
+Transformations multi-clients en parallèle sur plusieurs cœurs
+
+transform_data est CPU-bound (filtres, groupby) : avec une douzaine de
+clients, les runs multi-clients l'enchaînent sur un seul cœur. Ici chaque
+client est transformé dans un process d'un pool.
+
+Les DataFrames ne sont pas picklés : chaque frame est posé colonne par
+colonne dans un bloc de mémoire partagée (multiprocessing.shared_memory) :
+- numériques / dates : buffer numpy tel quel
+- category : codes (les catégories, petites, passent dans la spec)
+- texte : factorize → codes + valeurs uniques
+Seule la spec (noms, dtypes, offsets) transite par pickle. Le worker lit le
+rapport brut directement dans le bloc partagé (sans copie) et renvoie le
+résultat transformé de la même façon.
+
+Sur une machine mono-cœur (ou ADJUST_TRANSFORM_WORKERS=1), rien ne change :
+les runners transforment en séquentiel comme avant.
+
+Usage:
+    from adjust_parallel import transform_clients
+    transformed = transform_clients(configs, prefetched)  # client → DataFrame
+"""
+
+import pandas as pd
+import numpy as np
+import os
+import io
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+from adjust_transform import compile_transform_plan
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+# Process de transformation (défaut: nombre de cœurs, 1 = séquentiel)
+TRANSFORM_WORKERS = int(os.environ.get("ADJUST_TRANSFORM_WORKERS", 0)) or os.cpu_count() or 1
+
+# Alignement des colonnes dans le bloc partagé
+BUFFER_ALIGN = 64
+
+
+# =============================================================================
+# FRAMES EN MÉMOIRE PARTAGÉE
+# =============================================================================
+
+def _encode_column(values: pd.Series) -> tuple:
+    """Colonne → (tableau numpy à poser dans le bloc, description pour la reconstruire)."""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.cat.codes.to_numpy(), {"kind": "category", "dtype": values.dtype}
+    if isinstance(values.dtype, np.dtype) and values.dtype.kind in "biufcmM":
+        return values.to_numpy(), {"kind": "numpy"}
+    codes, uniques = pd.factorize(values, use_na_sentinel=True)
+    return codes, {"kind": "factorized", "dtype": values.dtype, "uniques": uniques}
+
+
+def _decode_column(array: np.ndarray, spec: dict):
+    """Inverse de _encode_column."""
+    if spec["kind"] == "category":
+        return pd.Categorical.from_codes(array, dtype=spec["dtype"])
+    if spec["kind"] == "factorized":
+        values = pd.array(spec["uniques"]).take(array, allow_fill=True)
+        return pd.array(values, dtype=spec["dtype"])
+    return array
+
+
+def export_frame(df: pd.DataFrame) -> tuple:
+    """
+    Copie un DataFrame dans un nouveau bloc de mémoire partagée.
+
+    Returns:
+        (SharedMemory, spec) : la spec (petite, picklable) suffit à
+        import_frame pour reconstruire le DataFrame dans un autre process
+    """
+    encoded = [(name,) + _encode_column(values) for name, values in df.items()]
+    if isinstance(df.index, pd.RangeIndex):
+        index_spec = {"kind": "range", "range": (df.index.start, df.index.stop, df.index.step)}
+    else:
+        encoded.append((None,) + _encode_column(pd.Series(df.index, copy=False)))
+        index_spec = {"kind": "column"}
+
+    # Offsets alignés, une seule allocation pour tout le frame
+    offset = 0
+    columns = []
+    for name, array, spec in encoded:
+        array = np.ascontiguousarray(array)
+        columns.append((name, array, dict(spec, dtype_buffer=array.dtype.str, length=len(array), offset=offset)))
+        offset += -(-array.nbytes // BUFFER_ALIGN) * BUFFER_ALIGN
+
+    shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    for _, array, spec in columns:
+        target = np.ndarray(len(array), dtype=array.dtype, buffer=shm.buf, offset=spec["offset"])
+        target[:] = array
+        del target
+
+    frame_spec = {
+        "shm": shm.name,
+        "columns": [(name, spec) for name, _, spec in columns if name is not None],
+        "index": dict(index_spec, column=columns[-1][2] if index_spec["kind"] == "column" else None)
+    }
+    return shm, frame_spec
+
+
+def import_frame(frame_spec: dict, copy: bool) -> tuple:
+    """
+    Reconstruit le DataFrame décrit par export_frame.
+
+    Args:
+        copy: False → les colonnes numériques pointent dans le bloc partagé
+              (zéro copie, le bloc doit rester ouvert tant que df vit)
+
+    Returns:
+        (DataFrame, SharedMemory)
+    """
+    shm = shared_memory.SharedMemory(name=frame_spec["shm"])
+
+    def read(spec: dict):
+        array = np.ndarray(spec["length"], dtype=np.dtype(spec["dtype_buffer"]), buffer=shm.buf, offset=spec["offset"])
+        return _decode_column(array.copy() if copy else array, spec)
+
+    index_spec = frame_spec["index"]
+    if index_spec["kind"] == "range":
+        index = pd.RangeIndex(*index_spec["range"])
+    else:
+        index = pd.Index(read(index_spec["column"]))
+
+    data = {name: read(spec) for name, spec in frame_spec["columns"]}
+    df = pd.DataFrame(data, index=index, copy=False)
+    return df, shm
+
+
+def _release(shm: shared_memory.SharedMemory, unlink: bool = False):
+    """Ferme un bloc (reste mappé tant que des vues numpy existent encore)."""
+    try:
+        shm.close()
+    except BufferError:
+        pass
+    if unlink:
+        shm.unlink()
+
+
+# =============================================================================
+# POOL
+# =============================================================================
+
+def _transform_worker(frame_spec: dict, config: dict, backend: str) -> tuple:
+    """Exécuté dans le pool : rapport brut partagé → résultat dans un nouveau bloc."""
+    log = io.StringIO()
+    df, shm_in = import_frame(frame_spec, copy=False)
+    try:
+        with contextlib.redirect_stdout(log):
+            print("🔄 Transformation des données...")
+            result = compile_transform_plan(config).run(df, backend=backend)
+        shm_out, result_spec = export_frame(result)
+        # Le parent lit puis libère le bloc de sortie
+        _release(shm_out)
+    finally:
+        del df
+        result = None
+        _release(shm_in)
+    return result_spec, log.getvalue()
+
+
+def transform_workers(n_jobs: int, max_workers: int = None) -> int:
+    """Nombre de process utilisés pour n_jobs transformations."""
+    return max(1, min(max_workers or TRANSFORM_WORKERS, n_jobs))
+
+
+def transform_many(jobs: list, max_workers: int = None, backend: str = None) -> list:
+    """
+    Transforme plusieurs rapports bruts en parallèle (un process par client).
+
+    Args:
+        jobs: Liste de (DataFrame brut, config client)
+        max_workers: Process max (défaut: TRANSFORM_WORKERS)
+        backend: "pandas" ou "polars" (voir adjust_transform)
+
+    Returns:
+        Liste dans l'ordre des jobs : DataFrame transformé, ou l'exception
+        levée pour ce job
+    """
+    workers = transform_workers(len(jobs), max_workers)
+    if workers == 1:
+        results = []
+        for df, config in jobs:
+            try:
+                results.append(compile_transform_plan(config).run(df, backend=backend))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    print(f"⚙️  Transformations en parallèle: {len(jobs)} clients sur {workers} process")
+    results = [None] * len(jobs)
+    inputs = []
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {}
+            # Gros rapports d'abord : meilleur équilibrage entre process
+            for i in sorted(range(len(jobs)), key=lambda i: -len(jobs[i][0])):
+                df, config = jobs[i]
+                shm, frame_spec = export_frame(df)
+                inputs.append(shm)
+                futures[i] = pool.submit(_transform_worker, frame_spec, config, backend)
+
+            for i, (_, config) in enumerate(jobs):
+                try:
+                    result_spec, log = futures[i].result()
+                except Exception as e:
+                    print(f"⚠️  {config['client']}: transformation en échec ({e})")
+                    results[i] = e
+                    continue
+                print(f"\n🧵 {config['client']}")
+                print(log, end="")
+                df, shm = import_frame(result_spec, copy=True)
+                _release(shm, unlink=True)
+                results[i] = df
+    finally:
+        for shm in inputs:
+            _release(shm, unlink=True)
+    return results
+
+
+def transform_clients(configs: list, raw_reports: dict, max_workers: int = None) -> dict:
+    """
+    Transforme en parallèle les rapports bruts des runs multi-clients.
+
+    Args:
+        configs: Configs clients
+        raw_reports: dict client → DataFrame brut (prefetch_reports)
+
+    Returns:
+        dict client → DataFrame transformé. Vide sur une machine mono-cœur ;
+        les clients absents (pas de rapport, transformation en échec) sont
+        transformés en séquentiel par le pipeline.
+    """
+    jobs = [config for config in configs if config['client'] in raw_reports]
+    if transform_workers(len(jobs), max_workers) == 1:
+        return {}
+
+    outputs = transform_many([(raw_reports[config['client']], config) for config in jobs], max_workers=max_workers)
+    return {
+        config['client']: df for config, df in zip(jobs, outputs)
+        if isinstance(df, pd.DataFrame)
+    }
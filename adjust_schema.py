@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+ADJUST SCHEMA
+Types explicites des colonnes Adjust (readable_names) à l'ingestion
+
+Au lieu de laisser pd.read_csv tout inférer (dimensions en object) :
+- Dimensions (Country, Network, Campaign, Adgroup, Creative, App, Week, Month)
+  → category : les groupby de transform_data travaillent sur les codes
+- Day (date) → datetime64 natif
+- Compteurs (Installs, Clicks, Impressions, événements) → int32
+  (float64 conservé si la colonne a des valeurs manquantes)
+- Revenues / coûts → float64
+
+Le moteur pyarrow de read_csv est utilisé s'il est installé.
+"""
+
+import pandas as pd
+
+# =============================================================================
+# REGISTRE DES COLONNES
+# =============================================================================
+
+DIMENSION_COLUMNS = [
+    "App",
+    "App Token",
+    "Month (date)",
+    "Week (date)",
+    "Country",
+    "Network (attribution)",
+    "Campaign (attribution)",
+    "Adgroup (attribution)",
+    "Creative (attribution)",
+    "Campaign name",
+    "Ad name"
+]
+
+DATE_COLUMNS = ["Day (date)"]
+
+COUNT_COLUMNS = ["Installs", "Clicks", "Impressions"]
+
+MONEY_COLUMNS = [
+    "Cost",
+    "Adspend",
+    "Ad spend",
+    "In-app revenue",
+    "0D All revenue total",
+    "7D All revenue total",
+    "30D All revenue total",
+    "all_revenue_total_d0",
+    "all_revenue_total_d7",
+    "all_revenue_total_d30"
+]
+
+
+def column_kind(column: str) -> str:
+    """Type logique d'une colonne Adjust : dimension, date, count, money ou None."""
+    if column in DIMENSION_COLUMNS:
+        return "dimension"
+    if column in DATE_COLUMNS:
+        return "date"
+    if column in COUNT_COLUMNS or column.endswith("_events"):
+        return "count"
+    if column in MONEY_COLUMNS or "revenue" in column.lower():
+        return "money"
+    return None
+
+
+def _has_pyarrow() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+CSV_ENGINE = "pyarrow" if _has_pyarrow() else "c"
+
+
+# =============================================================================
+# FONCTIONS
+# =============================================================================
+
+def apply_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """Convertit (en place) les colonnes connues vers leur type d'ingestion."""
+    for col in df.columns:
+        kind = column_kind(col)
+
+        if kind == "dimension":
+            if not isinstance(df[col].dtype, pd.CategoricalDtype):
+                df[col] = df[col].astype("category")
+        elif kind == "date":
+            df[col] = pd.to_datetime(df[col])
+        elif kind == "count":
+            values = pd.to_numeric(df[col])
+            # int32 seulement si aucune valeur manquante (sinon NaN → float64)
+            df[col] = values.astype("int32") if not values.isna().any() else values.astype("float64")
+        elif kind == "money":
+            df[col] = pd.to_numeric(df[col]).astype("float64")
+    return df
+
+
+def read_adjust_csv(source) -> pd.DataFrame:
+    """pd.read_csv typé pour un csv_report Adjust (moteur pyarrow si disponible)."""
+    return apply_schema(pd.read_csv(source, engine=CSV_ENGINE))
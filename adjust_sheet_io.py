@@ -0,0 +1,455 @@
+#!/usr/bin/env python3
+"""
+ADJUST SHEET IO
+Lectures partielles et écritures différentielles des Google Sheets clients
+
+Lecture — les mises à jour de revenues ne touchent que la fenêtre glissante (30
+derniers jours), mais lisaient tout l'historique du sheet (get_all_records,
+get_as_dataframe) avant d'en jeter l'essentiel.
+
+Les sheets étant triés par 'Day (date)', la première ligne de la fenêtre
+est trouvée par recherche dichotomique sur la colonne date : à chaque
+appel, PROBES_PER_CALL cellules réparties sur l'intervalle restant sont
+lues en un seul values.batchGet (3-4 appels pour 200k lignes). Seule la
+plage [première ligne de la fenêtre → fin du sheet] est ensuite lue :
+temps et mémoire ne dépendent plus de la longueur de l'historique.
+
+Écriture — chaque push faisait sheet.clear() + set_with_dataframe du
+frame complet, même quand seules trois colonnes de revenues bougeaient sur
+quelques milliers de lignes. write_sheet_diff compare le nouveau frame au
+dernier contenu lu du sheet, cellule par cellule (vectorisé, nombres et
+dates comparés par valeur), regroupe les cellules modifiées en plages A1
+rectangulaires contiguës et les envoie en un seul values.batchUpdate.
+
+Ajout — un run quotidien qui n'apporte que des jours plus récents que la
+dernière ligne du sheet n'a besoin ni de lire ni de réécrire l'historique :
+append_if_newer lit la date de la dernière ligne (quelques cellules) et
+ajoute les lignes en fin de sheet en un seul values.append.
+
+Usage:
+    from adjust_sheet_io import read_sheet_window, write_sheet_diff
+    df, start_row = read_sheet_window(sheet, since)
+    ...
+    write_sheet_diff(sheet, df_updated, previous=df, start_row=start_row)
+"""
+
+import pandas as pd
+import numpy as np
+import os
+from numbers import Real
+from gspread.utils import rowcol_to_a1, fill_gaps
+from pandas.io.parsers import TextParser
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+# Colonne de tri des sheets clients
+DATE_COLUMN = 'Day (date)'
+
+# Cellules lues par appel pendant la recherche dichotomique
+PROBES_PER_CALL = int(os.environ.get("ADJUST_SHEET_PROBES", 64))
+
+# Même rendu que get_as_dataframe(evaluate_formulas=True)
+VALUE_PARAMS = {
+    "valueRenderOption": "UNFORMATTED_VALUE",
+    "dateTimeRenderOption": "FORMATTED_STRING",
+}
+
+# Au-delà, les modifications sont envoyées en une seule plage (première ligne modifiée → fin)
+MAX_DIFF_RANGES = int(os.environ.get("ADJUST_SHEET_MAX_RANGES", 2000))
+
+
+# =============================================================================
+# HELPERS
+# =============================================================================
+
+def _quote(sheet) -> str:
+    """Titre de l'onglet pour la notation A1 ('Feuille 1'!A1)."""
+    return "'" + sheet.title.replace("'", "''") + "'"
+
+
+def _column_letter(col: int) -> str:
+    """Numéro de colonne (1 = A) → lettre(s)."""
+    return rowcol_to_a1(1, col)[:-1]
+
+
+def read_header(sheet) -> list:
+    """En-tête du sheet (ligne 1)."""
+    data = sheet.spreadsheet.values_get(f"{_quote(sheet)}!1:1", params=VALUE_PARAMS)
+    values = data.get("values", [])
+    return [str(name) for name in values[0]] if values else []
+
+
+def _probe_dates(sheet, column: str, rows: list) -> list:
+    """
+    Dates des cellules column{row} en un seul appel.
+
+    Returns:
+        Timestamp par ligne, None pour une cellule vide (fin des données)
+
+    Raises:
+        ValueError: Cellule non vide qui n'est pas une date
+    """
+    ranges = [f"{_quote(sheet)}!{column}{row}" for row in rows]
+    data = sheet.spreadsheet.values_batch_get(ranges, params=VALUE_PARAMS)
+
+    dates = []
+    for value_range in data.get("valueRanges", []):
+        values = value_range.get("values")
+        value = values[0][0] if values and values[0] else ""
+        if value == "":
+            dates.append(None)
+            continue
+        parsed = pd.to_datetime(str(value), errors="coerce")
+        if pd.isna(parsed):
+            raise ValueError(f"date illisible dans la colonne {column}: {value!r}")
+        dates.append(parsed)
+    return dates
+
+
+# =============================================================================
+# FENÊTRE PAR DATE
+# =============================================================================
+
+def find_window_start(sheet, date_col: int, since) -> int:
+    """
+    Première ligne du sheet dont la date est >= since.
+
+    Suppose le sheet trié par date croissante (lignes vides à la fin).
+
+    Args:
+        sheet: Worksheet gspread
+        date_col: Numéro de la colonne date (1 = A)
+        since: Première date de la fenêtre
+
+    Returns:
+        Numéro de ligne (>= 2), ou row_count + 1 si toutes les lignes sont plus anciennes
+    """
+    since = pd.Timestamp(since)
+    column = _column_letter(date_col)
+
+    # Invariant : lignes < lo plus anciennes que since, ligne hi dans la fenêtre (ou après la fin)
+    lo, hi = 2, sheet.row_count + 1
+    while lo < hi:
+        step = -(-(hi - lo) // PROBES_PER_CALL)
+        rows = list(range(lo, hi, step))
+        dates = _probe_dates(sheet, column, rows)
+
+        inside = [i for i, d in enumerate(dates) if d is None or d >= since]
+        if not inside:
+            lo = rows[-1] + 1
+            continue
+        first = inside[0]
+        hi = rows[first]
+        if first > 0:
+            lo = rows[first - 1] + 1
+    return lo
+
+
+def find_data_end(sheet, date_col: int) -> tuple:
+    """
+    Dernière ligne de données et sa date.
+
+    La grille s'arrête en général à la dernière ligne écrite : une seule
+    cellule lue dans ce cas, sinon recherche de la première cellule vide.
+
+    Returns:
+        (numéro de ligne, date), (1, None) si le sheet n'a que l'en-tête
+    """
+    column = _column_letter(date_col)
+    if sheet.row_count >= 2:
+        last_date = _probe_dates(sheet, column, [sheet.row_count])[0]
+        if last_date is not None:
+            return sheet.row_count, last_date
+
+    last_row = find_window_start(sheet, date_col, pd.Timestamp.max) - 1
+    if last_row < 2:
+        return last_row, None
+    return last_row, _probe_dates(sheet, column, [last_row])[0]
+
+
+def _read_rows(sheet, header: list, start_row: int) -> pd.DataFrame:
+    """
+    Lignes start_row → fin du sheet, parsées comme get_as_dataframe.
+
+    L'index est la position relative à start_row (ligne du sheet =
+    start_row + index) : les lignes vides retirées ne décalent pas les
+    autres, ce dont write_sheet_diff a besoin.
+    """
+    if not header:
+        return pd.DataFrame()
+
+    values = []
+    if start_row <= sheet.row_count:
+        last_column = _column_letter(len(header))
+        data = sheet.spreadsheet.values_get(
+            f"{_quote(sheet)}!A{start_row}:{last_column}{sheet.row_count}",
+            params=VALUE_PARAMS
+        )
+        values = data.get("values", [])
+        if values:
+            values = fill_gaps(values, cols=len(header))
+    return TextParser([header] + values, skip_blank_lines=False).read().dropna(how='all')
+
+
+def read_sheet_rows(sheet) -> pd.DataFrame:
+    """Tout le sheet (en-tête en ligne 1), au format attendu par write_sheet_diff."""
+    return _read_rows(sheet, read_header(sheet), 2)
+
+
+def read_sheet_window(sheet, since, date_column: str = DATE_COLUMN) -> tuple:
+    """
+    Lit uniquement les lignes du sheet dont la date est >= since.
+
+    Args:
+        sheet: Worksheet gspread trié par date_column
+        since: Première date de la fenêtre
+        date_column: Colonne de tri
+
+    Returns:
+        (DataFrame de la fenêtre, numéro de sa première ligne dans le sheet),
+        ou (None, None) si la lecture partielle n'est pas possible (colonne
+        date absente, dates illisibles, sheet non trié) : l'appelant relit
+        alors tout le sheet
+    """
+    header = read_header(sheet)
+    if date_column not in header:
+        return None, None
+
+    try:
+        start_row = find_window_start(sheet, header.index(date_column) + 1, since)
+    except ValueError as e:
+        print(f"   ⚠️  Lecture partielle impossible ({e})")
+        return None, None
+
+    df = _read_rows(sheet, header, start_row)
+
+    # Garde-fou : la dichotomie n'a de sens que sur un sheet trié
+    dates = pd.to_datetime(df[date_column], errors="coerce")
+    if dates.isna().any() or not dates.is_monotonic_increasing:
+        print("   ⚠️  Sheet non trié par date, lecture complète")
+        return None, None
+
+    print(f"   📖 Fenêtre lue: {len(df)} lignes à partir de la ligne {start_row}")
+    return df, start_row
+
+
+# =============================================================================
+# ÉCRITURE DIFFÉRENTIELLE
+# =============================================================================
+
+def _canonical(values: pd.Series, dates: bool) -> np.ndarray:
+    """
+    Valeurs comparables cellule à cellule : nombres → float, vide → '',
+    dates → Timestamp si la colonne est une date côté nouveau frame,
+    texte sinon.
+    """
+    out = values.astype(object).to_numpy(copy=True)
+    text = values.astype(str).to_numpy()
+    blank = values.isna().to_numpy() | (text == "")
+
+    if dates:
+        parsed = pd.to_datetime(values, errors="coerce", format="mixed")
+        known = parsed.notna().to_numpy()
+        out[known] = parsed[known].to_numpy(dtype=object)
+    else:
+        numbers = pd.to_numeric(values, errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+        known = ~np.isnan(numbers)
+        out[known] = numbers[known]
+
+    other = ~known & ~blank
+    out[other] = text[other]
+    out[blank] = ""
+    return out
+
+
+def _cell_value(value):
+    """Valeur envoyée à l'API, comme set_with_dataframe (vide pour NaN, nombres tels quels)."""
+    if pd.isnull(value) is True:
+        return ""
+    if isinstance(value, Real):
+        return value.item() if isinstance(value, np.generic) else value
+    return str(value)
+
+
+def _sheet_columns(header: list, previous: pd.DataFrame, df: pd.DataFrame, window: bool) -> list:
+    """
+    Colonnes à écrire, dans l'ordre du sheet.
+
+    - fenêtre : en-tête du sheet (les lignes au-dessus ne bougent pas),
+      colonnes nouvelles ajoutées à droite
+    - sheet complet : comme l'ancien clear + set_with_dataframe, le sheet
+      reprend les colonnes de df ; les colonnes vides du sheet absentes de
+      df restent en place (rien à écrire), et si df réordonne les colonnes
+      son ordre l'emporte
+    """
+    extras = [c for c in df.columns if c not in header]
+    if window:
+        return header + extras
+
+    kept = [c for c in header if c in df.columns or (_canonical(previous[c], False) == "").all()]
+    in_df = [c for c in kept if c in df.columns]
+    if in_df != [c for c in df.columns if c in header]:
+        return list(df.columns)
+    return kept + extras
+
+
+def diff_ranges(previous: pd.DataFrame, df: pd.DataFrame, start_row: int = 2) -> list:
+    """
+    Plages A1 à écrire pour que les lignes start_row → fin passent de
+    previous à df.
+
+    Args:
+        previous: Dernier contenu lu (index = position relative à start_row)
+        df: Nouveau contenu, dans l'ordre des lignes du sheet
+        start_row: Ligne du sheet de la première ligne de df
+
+    Returns:
+        Liste de {"range": "A2:C10", "values": [[...]]}
+    """
+    columns = list(df.columns)
+    width = max(len(columns), len(previous.columns))
+    n_rows = len(df)
+    if len(previous):
+        n_rows = max(n_rows, int(previous.index.max()) + 1)
+    previous = previous.reindex(range(n_rows))
+
+    changed = np.zeros((n_rows, width), dtype=bool)
+    for j in range(width):
+        new = df.iloc[:, j] if j < len(columns) else pd.Series([""] * len(df), dtype=object)
+        new = new.reset_index(drop=True).reindex(range(n_rows))
+        old = previous.iloc[:, j] if j < len(previous.columns) else pd.Series([""] * n_rows, dtype=object)
+        dates = pd.api.types.is_datetime64_any_dtype(new)
+        same_column = j < len(previous.columns) and j < len(columns) and previous.columns[j] == columns[j]
+        if same_column:
+            changed[:, j] = _canonical(old, dates) != _canonical(new, dates)
+        else:
+            changed[:, j] = (_canonical(old, False) != "") | (_canonical(new, dates) != "")
+
+    if not changed.any():
+        return []
+
+    # Segments horizontaux (ligne, colonne début, colonne fin exclue)
+    padded = np.zeros((n_rows, width + 2), dtype=np.int8)
+    padded[:, 1:-1] = changed
+    edges = np.diff(padded, axis=1)
+    rows, starts = np.nonzero(edges == 1)
+    _, ends = np.nonzero(edges == -1)
+
+    # Segments identiques sur des lignes consécutives → un seul rectangle
+    order = np.lexsort((rows, ends, starts))
+    rows, starts, ends = rows[order], starts[order], ends[order]
+    new_block = np.ones(len(rows), dtype=bool)
+    new_block[1:] = (starts[1:] != starts[:-1]) | (ends[1:] != ends[:-1]) | (rows[1:] != rows[:-1] + 1)
+    first = np.flatnonzero(new_block)
+    last = np.append(first[1:], len(rows)) - 1
+    blocks = list(zip(rows[first], rows[last], starts[first], ends[first]))
+
+    if len(blocks) > MAX_DIFF_RANGES:
+        blocks = [(int(rows.min()), n_rows - 1, 0, width)]
+
+    ranges = []
+    for r0, r1, c0, c1 in blocks:
+        a1 = f"{rowcol_to_a1(start_row + r0, c0 + 1)}:{rowcol_to_a1(start_row + r1, c1)}"
+        block = df.iloc[r0:r1 + 1, c0:c1].to_numpy(dtype=object)
+        values = [[_cell_value(v) for v in row] for row in block]
+        # Lignes / colonnes au-delà de df : cellules à vider
+        values = [row + [""] * (c1 - c0 - len(row)) for row in values]
+        values += [[""] * (c1 - c0)] * (r1 + 1 - r0 - len(values))
+        ranges.append({"range": a1, "values": values})
+    return ranges
+
+
+def write_sheet_diff(sheet, df: pd.DataFrame, previous: pd.DataFrame, start_row: int = 2) -> int:
+    """
+    Écrit dans le sheet uniquement les cellules qui diffèrent de previous.
+
+    Les colonnes suivent l'en-tête du sheet (voir _sheet_columns) pour que
+    les cellules inchangées restent à leur place.
+
+    Args:
+        sheet: Worksheet gspread
+        df: Nouveau contenu des lignes start_row → fin
+        previous: Dernier contenu lu de ces lignes (read_sheet_rows,
+                  read_sheet_window, get_all_records), vide si inconnu
+        start_row: Première ligne concernée (2 = tout le sheet)
+
+    Returns:
+        Nombre de cellules écrites
+    """
+    header = list(previous.columns)
+    df = df.reindex(columns=_sheet_columns(header, previous, df, window=start_row > 2))
+    columns = list(df.columns)
+
+    ranges = diff_ranges(previous, df, start_row)
+    if columns != header:
+        ranges.append({"range": "A1", "values": [columns + [""] * (len(header) - len(columns))]})
+    if not ranges:
+        print("   ✏️  Diff: aucune cellule modifiée")
+        return 0
+
+    # Agrandit la grille si nécessaire (jamais de réduction)
+    rows_needed = start_row + len(df) - 1
+    cols_needed = max(len(columns), len(header))
+    if rows_needed > sheet.row_count or cols_needed > sheet.col_count:
+        sheet.resize(rows=max(rows_needed, sheet.row_count), cols=max(cols_needed, sheet.col_count))
+
+    data = [{"range": f"{_quote(sheet)}!{r['range']}", "values": r["values"]} for r in ranges]
+    sheet.spreadsheet.values_batch_update(body={"valueInputOption": "USER_ENTERED", "data": data})
+
+    n_cells = sum(len(r["values"]) * len(r["values"][0]) for r in ranges)
+    print(f"   ✏️  Diff: {n_cells} cellules écrites en {len(ranges)} plages")
+    return n_cells
+
+
+# =============================================================================
+# AJOUT EN FIN DE SHEET
+# =============================================================================
+
+def append_if_newer(sheet, df: pd.DataFrame, date_column: str = DATE_COLUMN) -> bool:
+    """
+    Ajoute df en fin de sheet si toutes ses lignes sont plus récentes que
+    la dernière ligne du sheet (trié par date_column).
+
+    Dans ce cas aucune ligne existante ne peut être mise à jour : le
+    résultat est celui d'un push complet (concat + tri), sans lire ni
+    réécrire l'historique.
+
+    Args:
+        sheet: Worksheet gspread trié par date_column
+        df: Nouvelles lignes
+        date_column: Colonne de tri
+
+    Returns:
+        True si les lignes ont été ajoutées, False si le push complet est
+        nécessaire (sheet vide, colonnes nouvelles, dates qui se chevauchent)
+    """
+    header = read_header(sheet)
+    if date_column not in header or date_column not in df.columns or df.empty:
+        return False
+    if any(c not in header for c in df.columns):
+        return False
+
+    new_dates = pd.to_datetime(df[date_column], errors="coerce")
+    if new_dates.isna().any():
+        return False
+
+    date_col = header.index(date_column) + 1
+    try:
+        last_row, last_date = find_data_end(sheet, date_col)
+    except ValueError:
+        return False
+    if last_date is None or new_dates.min() <= last_date:
+        return False
+
+    order = np.argsort(new_dates.to_numpy(), kind="stable")
+    rows = df.iloc[order].reindex(columns=header).to_numpy(dtype=object)
+    values = [[_cell_value(v) for v in row] for row in rows]
+    sheet.spreadsheet.values_append(
+        f"{_quote(sheet)}!A{last_row}",
+        params={"valueInputOption": "USER_ENTERED", "insertDataOption": "INSERT_ROWS"},
+        body={"values": values}
+    )
+    print(f"   ⏩ Ajout en fin de sheet: {len(values)} lignes après le {last_date.strftime('%Y-%m-%d')}")
+    return True
@@ -8,19 +8,23 @@ Date: Novembre 2025
 """
 
 import pandas as pd
-import requests
-import io
 from datetime import datetime, timedelta
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
 from googleapiclient.discovery import build
 import gspread
-from gspread_dataframe import set_with_dataframe
 import os
 import pickle
 import json
 
+from adjust_client import get_adjust_client, split_date_range, DEFAULT_CHUNKSIZE
+from adjust_watermark import WatermarkStore
+from adjust_transform import SHARPER_NETWORK, TRANSFORM_DEBUG, compile_transform_plan
+from adjust_memo import get_default_memo
+from adjust_upsert import upsert, common_columns, SHEET_JOIN_KEYS, REVENUE_COLUMNS
+from adjust_sheet_io import read_sheet_rows, read_sheet_window, write_sheet_diff
+
 # =============================================================================
 # CONFIGURATION
 # =============================================================================
@@ -156,11 +160,20 @@ def pull_from_adjust(
     metrics: str = None,
     include_revenue: bool = False,
     events: list = None,  # ✅ AJOUTÉ : Liste d'événements (ex: ['first_purchase'])
-    store_id: str = None  # ✅ NOUVEAU : Store ID pour filtrer iOS/Android
+    store_id: str = None,  # ✅ NOUVEAU : Store ID pour filtrer iOS/Android
+    networks: list = None,  # ✅ NOUVEAU : filtre network côté API (ex: ["Sharper"])
+    countries: list = None,  # ✅ NOUVEAU : filtre pays côté API (ex: ["France"])
+    shard: str = None,  # ✅ NOUVEAU : "day" ou "week" pour découper la période
+    max_workers: int = 4,
+    chunksize: int = None  # ✅ NOUVEAU : lecture CSV en streaming par chunks
 ) -> pd.DataFrame:
     """
     Pull les données depuis l'API Adjust.
     
+    Raccourci vers le client partagé du token ADJUST_API_TOKEN courant
+    (voir adjust_client.AdjustClient.pull). Les scripts multi-clients
+    utilisent directement get_adjust_client(config['api_token']).
+    
     Args:
         app_token: Token de l'app Adjust (ex: "30kmesrwq3nk")
         begin_date: Date de début (format YYYY-MM-DD)
@@ -171,72 +184,75 @@ def pull_from_adjust(
         include_revenue: Si True, ajoute les métriques de revenue
         events: Liste d'événements à récupérer (ex: ['first_purchase'])
         store_id: Store ID pour filtrer iOS/Android (ex: "1222993561")
+        networks: Networks à garder, filtrés par l'API (voir build_pushdown_filters)
+        countries: Pays à garder (noms readable_names), filtrés par l'API
+        shard: Si "day" ou "week", découpe la période en fenêtres récupérées
+               en parallèle (utile pour les gros backfills). Nécessite la
+               dimension "day", sinon une seule requête est envoyée.
+        max_workers: Nombre max de requêtes simultanées en mode shard
+        chunksize: Si fourni, lit la réponse en streaming par chunks de N lignes
+                   (évite de garder le CSV brut en mémoire). Pour une mémoire
+                   bornée de bout en bout, utiliser AdjustClient.iter_report.
     
     Returns:
         DataFrame avec les données Adjust
     """
-    print(f"📥 Pull Adjust: {begin_date} → {end_date}")
-    
-    # Métriques par défaut selon le client
-    if metrics is None:
-        if include_revenue:
-            metrics = "installs,clicks,impressions,revenue,all_revenue_total_d0,all_revenue_total_d7,all_revenue_total_d30"
-        else:
-            metrics = "installs,clicks,impressions"
-    
-    # ✅ Ajouter les événements aux métriques (SANS suffixes d0/d7/d30)
-    if events:
-        # On ajoute juste les événements tels quels
-        metrics = metrics + "," + ",".join(events)
-        print(f"   📊 Événements ajoutés: {', '.join(events)}")
-    
-    params = {
-        "date_period": f"{begin_date}:{end_date}",
-        "dimensions": dimensions,
-        "metrics": metrics,
-        "readable_names": True,
-        "utc_offset": "+01:00",  # Paris timezone (UTC+1)
-        "attribution_source": "first",  # ✅ CORRIGÉ : utilise First attribution (pas Dynamic)
-        "attribution_type": "all",  # Type d'attribution (all/click/impression)
-        "currency": "EUR",
-        "app_token__in": app_token
-    }
+    return get_adjust_client(ADJUST_API_TOKEN).pull(
+        app_token=app_token,
+        begin_date=begin_date,
+        end_date=end_date,
+        adjust_account_id=adjust_account_id,
+        dimensions=dimensions,
+        metrics=metrics,
+        include_revenue=include_revenue,
+        events=events,
+        store_id=store_id,
+        networks=networks,
+        countries=countries,
+        shard=shard,
+        max_workers=max_workers,
+        chunksize=chunksize
+    )
+
+
+def build_pushdown_filters(config: dict, begin_date: str, end_date: str) -> dict:
+    """
+    Traduit les filtres de transform_data en filtres de requête Adjust.
     
-    # CRITIQUE : Ajouter l'account ID si fourni
-    if adjust_account_id:
-        params['adjust_account_id'] = adjust_account_id
-        print(f"   Account ID: {adjust_account_id}")
+    - Network = Sharper → network__in
+    - config["countries"] → country_code__in
+    - config["start_date"] → début de période avancé à start_date
     
-    # ✅ NOUVEAU : Ajouter le store_id si fourni
-    if store_id:
-        params['store_id'] = store_id
-        print(f"   Store ID: {store_id}")
+    Les filtres locaux de transform_data restent appliqués (filet de sécurité).
     
-    headers = {
-        "Authorization": f"Bearer {ADJUST_API_TOKEN}"
-    }
+    Returns:
+        dict de kwargs pour pull_from_adjust / AdjustClient.pull
+        (begin_date, networks, countries)
+    """
+    filters = {"begin_date": begin_date, "networks": [SHARPER_NETWORK]}
     
-    endpoint = "https://automate.adjust.com/reports-service/csv_report"
+    if config.get("countries"):
+        filters["countries"] = list(config["countries"])
     
-    response = requests.get(endpoint, headers=headers, params=params)
+    # Seulement si la période garde au moins un jour (sinon le filtre local vide tout)
+    start_date = config.get("start_date")
+    if start_date and begin_date < start_date <= end_date:
+        filters["begin_date"] = start_date
     
-    if response.status_code == 200:
-        print("✅ Données récupérées avec succès")
-        df = pd.read_csv(io.StringIO(response.text))
-        df = df.sort_values('Day (date)')
-        print(f"   {len(df)} lignes récupérées")
-        return df
-    else:
-        print(f"❌ Erreur API: {response.status_code}")
-        print(response.text)
-        raise ValueError(f"Failed to retrieve data: {response.status_code}")
+    return filters
 
 
 # =============================================================================
 # FONCTIONS DE TRANSFORMATION
 # =============================================================================
 
-def transform_data(df: pd.DataFrame, config: dict) -> pd.DataFrame:
+def transform_data(
+    df: pd.DataFrame,
+    config: dict,
+    backend: str = None,
+    debug: bool = None,
+    memo="default"
+) -> pd.DataFrame:
     """
     Applique les transformations sur les données.
     
@@ -245,194 +261,87 @@ def transform_data(df: pd.DataFrame, config: dict) -> pd.DataFrame:
     - Filtre installs > 0 corrigé pour tous les clients Lalalab
     - Support First Purchase et autres événements
     - Filtre pays appliqué dès le début
+    
+    Les étapes sont compilées une fois par config (voir adjust_transform.TransformPlan).
+    
+    Args:
+        backend: "pandas" ou "polars" (défaut: ADJUST_TRANSFORM_BACKEND, sinon pandas).
+                 Même résultat, polars agrège en multi-thread.
+        debug: Affiche les octets alloués par étape (défaut: ADJUST_TRANSFORM_DEBUG=1)
+        memo: TransformMemo à utiliser, None pour désactiver ("default" = memo partagé).
+              Un même df brut + même config ne sont transformés qu'une fois.
     """
     print("🔄 Transformation des données...")
+    plan = compile_transform_plan(config)
+    
+    if memo == "default":
+        memo = get_default_memo()
+    # En debug on veut mesurer la transformation, pas un résultat mémoïsé
+    if memo is None or debug or (debug is None and TRANSFORM_DEBUG):
+        return plan.run(df, backend=backend, debug=debug)
+    return memo.get_or_compute(df, config, lambda: plan.run(df, backend=backend, debug=debug))
+
+
+def pull_and_transform_chunked(
+    config: dict,
+    begin_date: str,
+    end_date: str,
+    shard: str = "week",
+    chunksize: int = DEFAULT_CHUNKSIZE,
+    backend: str = None,
+    **report_kwargs
+) -> pd.DataFrame:
+    """
+    Pull + transform_data pour les gros backfills (plusieurs mois), sans
+    jamais garder le rapport brut complet en mémoire.
     
-    tmp = df.copy()
-    client = config["client"]
+    Chaque shard de dates est streamé par chunks de chunksize lignes ;
+    chaque chunk est agrégé puis les sommes partielles sont fusionnées
+    (TransformPlan.run_chunked). Résultat identique à
+    transform_data(pull_from_adjust(...)) aux dtypes category près.
     
-    # ✅ FILTRE PAYS EN PREMIER (avant toute autre transformation)
-    if config.get("countries"):
-        countries_to_keep = config["countries"]
-        if "Country" in tmp.columns:
-            before_count = len(tmp)
-            tmp = tmp[tmp["Country"].isin(countries_to_keep)]
-            print(f"   🌍 Filtré sur pays {', '.join(countries_to_keep)}: {before_count} → {len(tmp)} lignes")
-    
-    # Filtre sur Network = Sharper
-    if "Network (attribution)" in tmp.columns:
-        tmp = tmp[tmp["Network (attribution)"] == "Sharper"]
-        print(f"   Filtré sur Sharper: {len(tmp)} lignes")
-    
-    # Filtre date de début
-    if config.get("start_date"):
-        tmp = tmp[pd.to_datetime(tmp["Day (date)"]) >= pd.to_datetime(config["start_date"])]
-        print(f"   Filtré depuis {config['start_date']}: {len(tmp)} lignes")
-    
-    # =========================================================================
-    # BUG FIX #1: Filtre installs > 0
-    # Le code original excluait seulement "Lalalab" exact, pas les variantes
-    # =========================================================================
-    CLIENTS_SANS_FILTRE_INSTALLS = [
-        "Showroomprive.com - Ventes privées",
-        "Lalalab",
-        "Lalalab Android", 
-        "Lalalab Client Report Android",
-        "Lalalab Client Report ios",
-        "Lalalab Client Report ios & Android",
-        "Bforbank - iOS",
-        "Bforbank"
-    ]
-    
-    if client not in CLIENTS_SANS_FILTRE_INSTALLS:
-        before_count = len(tmp)
-        tmp = tmp[tmp["Installs"] > 0]
-        print(f"   Filtre installs > 0: {before_count} → {len(tmp)} lignes")
+    Args:
+        config: Configuration du client (api_token optionnel, sinon ADJUST_API_TOKEN)
+        shard: "day" ou "week" (nécessite la dimension "day", sinon un seul shard)
+        chunksize: Lignes CSV par chunk
+        backend: "pandas" ou "polars" pour l'agrégation des chunks
+        report_kwargs: arguments de build_report_params (adjust_account_id,
+                       dimensions, metrics, include_revenue, events, ...)
+    """
+    print("🔄 Pull + transformation par chunks (map-reduce)...")
+    adjust_client = get_adjust_client(config.get("api_token", ADJUST_API_TOKEN))
+    
+    dimensions = report_kwargs.get("dimensions", "day,country,network,campaign,creative,adgroup")
+    if shard and "day" in dimensions.split(","):
+        windows = split_date_range(begin_date, end_date, shard)
     else:
-        print(f"   ⚠️  Pas de filtre installs > 0 pour {client}")
-        tmp["Impressions"] = tmp["Impressions"].fillna(0)
-    
-    # =========================================================================
-    # CUSTOM CPI pour LALALAB
-    # =========================================================================
-    if config.get("custom_cpi") and len(config["custom_cpi"]) > 0:
-        # Initialise CPI et Adspend
-        tmp['CPI'] = 0.0
-        tmp['Adspend'] = 0.0
-        
-        # Applique les custom CPI par pays
-        for country, cpi in config["custom_cpi"].items():
-            print(f"   Custom CPI {country}: {cpi}€")
-            tmp.loc[tmp["Country"] == country, "CPI"] = cpi
-            tmp.loc[tmp["Country"] == country, "Adspend"] = (
-                tmp.loc[tmp["Country"] == country, "Installs"].astype(float) * cpi
-            )
+        windows = [(begin_date, end_date)]
     
-    # =========================================================================
-    # BUG FIX #2: Groupby avec colonnes revenue + événements exclues
-    # =========================================================================
-    if config.get("group_by_most_spending_campaign"):
-        print("   Grouping by most spending campaign...")
-        pass
-    
-    # Agrégation finale
-    if config.get("agg_columns"):
-        # Colonnes numériques à sommer (SANS CPI qui sera recalculé)
-        NUMERIC_COLS_TO_SUM = [
-            "Impressions", "Clicks", "Installs", "Adspend",
-            "In-app revenue", "0D All revenue total", "7D All revenue total", "30D All revenue total",
-            "all_revenue_total_d0", "all_revenue_total_d7", "all_revenue_total_d30"
-        ]
-        
-        # ✅ Ajoute les colonnes d'événements (ex: First Purchase)
-        # Note : Les événements n'ont PAS de suffixes _d0/_d7/_d30 dans l'API
-        event_columns = [c for c in tmp.columns if any(
-            ev in c.lower() for ev in ['first_purchase', 'first purchase', 'purchase_events']
-        )]
-        NUMERIC_COLS_TO_SUM.extend(event_columns)
-        
-        # Colonnes d'agrégation présentes dans le DataFrame
-        agg_cols = [c for c in config["agg_columns"] if c in tmp.columns]
-        
-        # Colonnes numériques présentes
-        numeric_cols = list(set([c for c in NUMERIC_COLS_TO_SUM if c in tmp.columns]))
-        
-        print(f"   Agrégation sur: {agg_cols}")
-        print(f"   Somme de: {numeric_cols}")
-        
-        # Groupby et somme
-        tmp = tmp.groupby(agg_cols, as_index=False)[numeric_cols].sum()
-        
-        # ✅ Recalcule CPI après l'agrégation
-        if "Adspend" in tmp.columns and "Installs" in tmp.columns:
-            tmp["CPI"] = tmp.apply(
-                lambda row: row["Adspend"] / row["Installs"] if row["Installs"] > 0 else 0, 
-                axis=1
+    def chunks():
+        for window_begin, window_end in windows:
+            yield from adjust_client.iter_report(
+                config["app_token"], window_begin, window_end,
+                chunksize=chunksize, **report_kwargs
             )
-        
-        print(f"   Après agrégation: {len(tmp)} lignes")
-    
-    # =========================================================================
-    # REGROUPEMENT LIGNES INSTALLS=0 POUR LALALAB
-    # =========================================================================
-    if "Lalalab" in client:
-        if "Installs" in tmp.columns:
-            print(f"   Avant regroupement installs=0: {len(tmp)} lignes")
-            
-            # Sépare les lignes avec et sans installs
-            tmp_with_installs = tmp[tmp["Installs"] > 0].copy()
-            tmp_zero_installs = tmp[tmp["Installs"] == 0].copy()
-            
-            if len(tmp_zero_installs) > 0:
-                # Pour les lignes installs=0, on regroupe par jour
-                groupby_cols = ["App", "Month (date)", "Week (date)", "Day (date)", 
-                               "Network (attribution)", "Country"]
-                groupby_cols = [c for c in groupby_cols if c in tmp_zero_installs.columns]
-                
-                # Colonnes numériques à sommer (SANS CPI qui sera recalculé)
-                numeric_cols = [c for c in tmp_zero_installs.columns 
-                               if c in ["Impressions", "Clicks", "Installs", "Adspend",
-                                       "In-app revenue", "0D All revenue total", 
-                                       "7D All revenue total", "30D All revenue total"] or 
-                                  'first_purchase' in c.lower() or 'first purchase' in c.lower()]
-                
-                # Regroupe les installs=0 par jour
-                tmp_zero_grouped = tmp_zero_installs.groupby(groupby_cols, as_index=False)[numeric_cols].sum()
-                
-                # ✅ Recalcule CPI après le regroupement
-                if "Adspend" in tmp_zero_grouped.columns and "Installs" in tmp_zero_grouped.columns:
-                    tmp_zero_grouped["CPI"] = 0  # CPI = 0 pour les lignes installs=0
-                
-                # Ajoute les colonnes manquantes avec valeur "other"
-                tmp_zero_grouped["Campaign (attribution)"] = "other"
-                tmp_zero_grouped["Adgroup (attribution)"] = "other"
-                tmp_zero_grouped["Creative (attribution)"] = "other"
-                
-                # Recombine
-                tmp = pd.concat([tmp_with_installs, tmp_zero_grouped], ignore_index=True)
-                tmp = tmp.sort_values("Day (date)")
-                
-                print(f"   Après regroupement installs=0: {len(tmp)} lignes")
-        
-        # Réordonnancement des colonnes pour Lalalab
-        lalalab_columns = [
-            "App",
-            "Month (date)",
-            "Week (date)",
-            "Day (date)",
-            "Network (attribution)",
-            "Country",
-            "Campaign (attribution)",
-            "Adgroup (attribution)",
-            "Creative (attribution)",
-            "Adspend",
-            "Installs",
-            "Impressions",
-            "Clicks",
-            "In-app revenue",
-            "0D All revenue total",
-            "7D All revenue total",
-            "30D All revenue total",
-            "CPI"
-        ]
-        
-        # ✅ Ajoute First Purchase si présent
-        first_purchase_cols = [c for c in tmp.columns if 'first_purchase' in c.lower() or 'first purchase' in c.lower()]
-        if first_purchase_cols:
-            lalalab_columns.extend(first_purchase_cols)
-        
-        # Garde uniquement les colonnes qui existent
-        existing_cols = [col for col in lalalab_columns if col in tmp.columns]
-        tmp = tmp[existing_cols]
-        print(f"   Colonnes Lalalab réordonnées: {len(existing_cols)} colonnes")
     
-    return tmp
+    return compile_transform_plan(config).run_chunked(chunks(), backend=backend)
 
 
 # =============================================================================
 # FONCTION PUSH GOOGLE SHEETS
 # =============================================================================
 
+def format_dates_for_sheet(df: pd.DataFrame) -> pd.DataFrame:
+    """Convertit les colonnes datetime64 en texte YYYY-MM-DD avant écriture dans le sheet."""
+    date_cols = [c for c in df.columns if pd.api.types.is_datetime64_any_dtype(df[c])]
+    if not date_cols:
+        return df
+    df = df.copy()
+    for col in date_cols:
+        df[col] = df[col].dt.strftime('%Y-%m-%d')
+    return df
+
+
 def push_to_gsheet(df: pd.DataFrame, config: dict, gc: gspread.Client) -> str:
     """
     Push les données vers Google Sheets.
@@ -446,9 +355,11 @@ def push_to_gsheet(df: pd.DataFrame, config: dict, gc: gspread.Client) -> str:
         wks = gc.open_by_key(sheet_id)
         sheet = wks.worksheet(sheet_name)
         
-        # Clear et push toutes les données
-        sheet.clear()
-        set_with_dataframe(sheet, df)
+        # Dates natives (datetime64) → texte YYYY-MM-DD comme dans le CSV Adjust
+        df = format_dates_for_sheet(df)
+        
+        # Push différentiel : seules les cellules qui changent sont écrites
+        write_sheet_diff(sheet, df, previous=read_sheet_rows(sheet))
         
         url = f"https://docs.google.com/spreadsheets/d/{sheet_id}"
         print(f"✅ Push réussi: {url}")
@@ -487,30 +398,33 @@ def update_revenues_only(
         wks = gc.open_by_key(sheet_id)
         sheet = wks.worksheet(sheet_name)
         
-        # 1. Lire les données existantes du Google Sheet
-        print("   📥 Lecture des données existantes...")
-        df_existing = pd.DataFrame(sheet.get_all_records())
+        # 1. Calculer la date limite (aujourd'hui - rolling_days)
+        from datetime import date, timedelta
+        cutoff_date = pd.to_datetime(date.today() - timedelta(days=rolling_days))
+        print(f"   📅 Mise à jour des revenues depuis: {cutoff_date.strftime('%Y-%m-%d')}")
         
-        if df_existing.empty:
+        # 2. Lire uniquement la fenêtre du sheet (trié par date) que les nouvelles données peuvent toucher
+        print("   📥 Lecture des données existantes...")
+        df_new['Day (date)'] = pd.to_datetime(df_new['Day (date)'])
+        since = min(cutoff_date, df_new['Day (date)'].min()) if len(df_new) else cutoff_date
+        df_existing, start_row = read_sheet_window(sheet, since)
+        if df_existing is None:
+            df_existing = pd.DataFrame(sheet.get_all_records())
+        # Contenu lu du sheet, base du push différentiel
+        df_previous = df_existing.copy(deep=False)
+        
+        if df_existing.empty and start_row in (None, 2):
             # Si le sheet est vide, push complet
             print("   ⚠️  Sheet vide, push complet à la place")
             return push_to_gsheet(df_new, config, gc)
         
         print(f"   📊 Données existantes: {len(df_existing)} lignes")
         
-        # 2. Convertir les dates en datetime
+        # 3. Convertir les dates en datetime
         df_existing['Day (date)'] = pd.to_datetime(df_existing['Day (date)'])
-        df_new['Day (date)'] = pd.to_datetime(df_new['Day (date)'])
-        
-        # 3. Calculer la date limite (aujourd'hui - rolling_days)
-        from datetime import date, timedelta
-        cutoff_date = pd.to_datetime(date.today() - timedelta(days=rolling_days))
-        print(f"   📅 Mise à jour des revenues depuis: {cutoff_date.strftime('%Y-%m-%d')}")
         
-        # 4. Colonnes revenues à mettre à jour
-        revenue_cols = ['0D All revenue total', '7D All revenue total', '30D All revenue total']
-        # Vérifier quelles colonnes revenues existent
-        revenue_cols_to_update = [col for col in revenue_cols if col in df_existing.columns and col in df_new.columns]
+        # 4. Colonnes revenues à mettre à jour (celles qui existent des deux côtés)
+        revenue_cols_to_update = common_columns(REVENUE_COLUMNS, df_existing, df_new)
         
         if not revenue_cols_to_update:
             print("   ⚠️  Aucune colonne revenue trouvée, push complet")
@@ -518,51 +432,26 @@ def update_revenues_only(
         
         print(f"   💰 Colonnes à mettre à jour: {', '.join(revenue_cols_to_update)}")
         
-        # 5. Créer les clés de jointure (toutes les dimensions sauf Day)
-        join_keys = [
-            'App', 'Month (date)', 'Week (date)', 'Day (date)', 
-            'Network (attribution)', 'Country',
-            'Campaign (attribution)', 'Adgroup (attribution)', 'Creative (attribution)'
-        ]
-        # Garder uniquement les clés qui existent dans les deux DataFrames
-        join_keys = [k for k in join_keys if k in df_existing.columns and k in df_new.columns]
+        # 5. Clés de jointure (dimensions présentes dans les deux DataFrames)
+        join_keys = common_columns(SHEET_JOIN_KEYS, df_existing, df_new)
         
         # 6. Séparer les données existantes : anciennes (> rolling_days) vs récentes (≤ rolling_days)
-        df_old = df_existing[df_existing['Day (date)'] < cutoff_date].copy()
-        df_recent_existing = df_existing[df_existing['Day (date)'] >= cutoff_date].copy()
+        df_old = df_existing[df_existing['Day (date)'] < cutoff_date]
+        df_recent_existing = df_existing[df_existing['Day (date)'] >= cutoff_date]
         
         print(f"   📊 Données anciennes conservées: {len(df_old)} lignes")
         print(f"   📊 Données récentes à mettre à jour: {len(df_recent_existing)} lignes")
         print(f"   📊 Nouvelles données: {len(df_new)} lignes")
         
-        # 7. Pour les données récentes : remplacer les revenues par les nouvelles valeurs
-        # Stratégie : On garde df_recent_existing et on met à jour seulement les colonnes revenues
-        
-        # Créer un identifiant unique pour chaque ligne
-        for df_temp in [df_recent_existing, df_new]:
-            df_temp['_merge_key'] = df_temp[join_keys].astype(str).agg('||'.join, axis=1)
-        
-        # Créer un dict des nouvelles revenues
-        revenue_dict = {}
-        for _, row in df_new.iterrows():
-            key = row['_merge_key']
-            revenue_dict[key] = {col: row[col] for col in revenue_cols_to_update}
-        
-        # Mettre à jour les revenues dans df_recent_existing
-        updated_count = 0
-        for idx, row in df_recent_existing.iterrows():
-            key = row['_merge_key']
-            if key in revenue_dict:
-                for col in revenue_cols_to_update:
-                    df_recent_existing.at[idx, col] = revenue_dict[key][col]
-                updated_count += 1
+        # 7. Pour les données récentes : remplacer les revenues par les nouvelles valeurs,
+        #    et repérer les nouvelles lignes qui n'existaient pas (upsert vectorisé)
+        df_recent_existing, df_truly_new, updated_count, _ = upsert(
+            df_recent_existing, df_new, join_keys, revenue_cols_to_update
+        )
         
         print(f"   ✅ Revenues mises à jour: {updated_count} lignes")
         
         # 8. Ajouter les nouvelles lignes qui n'existaient pas
-        new_keys = set(df_new['_merge_key']) - set(df_recent_existing['_merge_key'])
-        df_truly_new = df_new[df_new['_merge_key'].isin(new_keys)].copy()
-        
         # ✅ CORRECTION CRITIQUE : Retirer Ad spend et CPI des nouvelles lignes
         # pour ne PAS écraser les valeurs existantes ou manuelles
         if len(df_truly_new) > 0:
@@ -582,31 +471,23 @@ def update_revenues_only(
                 elif col in ['Installs', 'Clicks', 'Impressions', 'In-app revenue']:
                     cols_to_keep.append(col)
                 # EXCLURE Ad spend et CPI
-                elif col not in ['Ad spend', 'CPI', '_merge_key']:
+                elif col not in ['Ad spend', 'CPI']:
                     cols_to_keep.append(col)
             
-            df_truly_new = df_truly_new[cols_to_keep]
-            
             # Ajouter Ad spend et CPI à 0 pour les nouvelles lignes
-            df_truly_new['Ad spend'] = 0
-            df_truly_new['CPI'] = 0
+            df_truly_new = df_truly_new[cols_to_keep].assign(**{'Ad spend': 0, 'CPI': 0})
             
             print(f"   ➕ Nouvelles lignes ajoutées: {len(df_truly_new)} (Ad spend/CPI = 0)")
         
         # 9. Recombiner tout
-        # Supprimer la colonne _merge_key avant de combiner
-        for df_temp in [df_old, df_recent_existing, df_truly_new]:
-            if '_merge_key' in df_temp.columns:
-                df_temp.drop('_merge_key', axis=1, inplace=True)
-        
         df_final = pd.concat([df_old, df_recent_existing, df_truly_new], ignore_index=True)
-        df_final = df_final.sort_values('Day (date)')
+        # (tri stable : les lignes existantes gardent leur place dans le sheet)
+        df_final = df_final.sort_values('Day (date)', kind='stable')
         
         print(f"   📊 Total final: {len(df_final)} lignes")
         
-        # 10. Push le résultat final
-        sheet.clear()
-        set_with_dataframe(sheet, df_final)
+        # 10. Push différentiel (seulement la fenêtre si lecture partielle)
+        write_sheet_diff(sheet, df_final, previous=df_previous, start_row=start_row or 2)
         
         url = f"https://docs.google.com/spreadsheets/d/{sheet_id}"
         print(f"✅ Mise à jour revenues réussie: {url}")
@@ -623,8 +504,13 @@ def update_revenues_only(
 # FONCTION PRINCIPALE
 # =============================================================================
 
-def run_pipeline(config: dict, begin_date: str = None, end_date: str = None):
-    """Exécute le pipeline complet pour un client."""
+def run_pipeline(config: dict, begin_date: str = None, end_date: str = None, incremental: bool = True):
+    """
+    Exécute le pipeline complet pour un client.
+    
+    Si incremental=True, seuls les nouveaux jours + la fenêtre de maturation
+    des revenues sont re-téléchargés (voir adjust_watermark).
+    """
     print("=" * 60)
     print(f"🚀 PIPELINE: {config['client']}")
     print("=" * 60)
@@ -646,14 +532,28 @@ def run_pipeline(config: dict, begin_date: str = None, end_date: str = None):
     else:
         dimensions = "day,country,network,campaign,creative,adgroup"
     
-    df = pull_from_adjust(
-        app_token=config["app_token"],
-        begin_date=begin_date,
-        end_date=end_date,
-        adjust_account_id=config.get("adjust_account_id"),
-        dimensions=dimensions,
-        include_revenue=include_revenue
-    )
+    # Filtres network / pays / start_date poussés dans la requête Adjust
+    filters = build_pushdown_filters(config, begin_date, end_date)
+    begin_date = filters.pop("begin_date")
+    
+    pull_kwargs = {
+        "app_token": config["app_token"],
+        "adjust_account_id": config.get("adjust_account_id"),
+        "dimensions": dimensions,
+        "include_revenue": include_revenue,
+        **filters
+    }
+    
+    # Incrémental : ne re-télécharge que depuis la fenêtre de maturation
+    watermarks = WatermarkStore() if incremental else None
+    fetch_begin = begin_date
+    if watermarks:
+        fetch_begin = watermarks.fetch_begin(config, begin_date, end_date, pull_kwargs)
+    
+    df = pull_from_adjust(begin_date=fetch_begin, end_date=end_date, **pull_kwargs)
+    
+    if watermarks:
+        df = watermarks.merge(config, df, fetch_begin, begin_date, end_date, pull_kwargs)
     
     # 2. Transform
     df = transform_data(df, config)
@@ -0,0 +1,883 @@
+#!/usr/bin/env python3
+"""
+ADJUST TRANSFORM
+Plan de transformation compilé une fois par config client
+
+transform_data re-testait le nom du client et les options de la config à
+chaque appel, recalculait le CPI ligne par ligne (apply axis=1) et
+appliquait les custom CPI avec un masque .loc par pays.
+
+Ici la config est compilée en TransformPlan (liste fixe d'étapes
+vectorisées), réutilisé pour tous les runs du même client :
+- un seul masque booléen combiné (pays, Sharper, start_date, installs > 0)
+- custom CPI : Country → CPI par table de correspondance
+- CPI = Adspend / Installs en division vectorisée
+
+Backend polars (optionnel, pip3 install polars) : filtres, custom CPI et
+groupby/somme exécutés en multi-thread sur les codes des colonnes category.
+Le résultat agrégé revient en pandas avec les mêmes dtypes, le même ordre de
+lignes et de colonnes que le chemin pandas. Sélection par backend="polars"
+ou par la variable d'environnement ADJUST_TRANSFORM_BACKEND=polars.
+
+Backfills : run_chunked agrège chunk par chunk (map-reduce), la mémoire
+suit le nombre de groupes en sortie et non le nombre de lignes brutes.
+
+Copies : le rapport brut n'est jamais copié en entier. Le filtre sélectionne
+lignes et colonnes utiles en une seule passe, les étapes suivantes ajoutent
+ou remplacent des colonnes sur ce résultat. ADJUST_TRANSFORM_DEBUG=1 (ou
+debug=True) affiche les octets alloués par étape (tracemalloc).
+
+Usage:
+    from adjust_transform import compile_transform_plan
+    df = compile_transform_plan(config).run(df_raw)
+    df = compile_transform_plan(config).run_chunked(client.iter_report(...))
+"""
+
+import pandas as pd
+import numpy as np
+import os
+import json
+import tracemalloc
+from contextlib import contextmanager
+
+from adjust_schema import apply_schema
+
+try:
+    import polars as pl
+    POLARS_AVAILABLE = True
+except ImportError:
+    pl = None
+    POLARS_AVAILABLE = False
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+# Map-reduce (run_chunked) : lignes partielles en attente avant fusion
+COMPACT_MIN_ROWS = 200_000
+
+# Backend par défaut : "pandas" ou "polars"
+TRANSFORM_BACKEND = os.environ.get("ADJUST_TRANSFORM_BACKEND", "pandas")
+
+# Agrégation : "numpy" (tri + réduction segmentée, voir group_sum) ou "pandas" (groupby)
+GROUP_SUM_KERNEL = os.environ.get("ADJUST_GROUP_SUM_KERNEL", "numpy")
+
+# Debug : octets alloués par étape (ADJUST_TRANSFORM_DEBUG=1)
+TRANSFORM_DEBUG = os.environ.get("ADJUST_TRANSFORM_DEBUG") == "1"
+
+# Network des campagnes Sharper (seul network gardé dans les rapports)
+SHARPER_NETWORK = "Sharper"
+
+# BUG FIX #1: Filtre installs > 0
+# Le code original excluait seulement "Lalalab" exact, pas les variantes
+CLIENTS_SANS_FILTRE_INSTALLS = [
+    "Showroomprive.com - Ventes privées",
+    "Lalalab",
+    "Lalalab Android",
+    "Lalalab Client Report Android",
+    "Lalalab Client Report ios",
+    "Lalalab Client Report ios & Android",
+    "Bforbank - iOS",
+    "Bforbank"
+]
+
+# Colonnes numériques à sommer (SANS CPI qui sera recalculé)
+NUMERIC_COLS_TO_SUM = [
+    "Impressions", "Clicks", "Installs", "Adspend",
+    "In-app revenue", "0D All revenue total", "7D All revenue total", "30D All revenue total",
+    "all_revenue_total_d0", "all_revenue_total_d7", "all_revenue_total_d30"
+]
+
+# Note : Les événements n'ont PAS de suffixes _d0/_d7/_d30 dans l'API
+EVENT_PATTERNS = ['first_purchase', 'first purchase', 'purchase_events']
+
+# Regroupement installs=0 (Lalalab) : campagne / adgroup / créa → "other"
+OTHER_LABEL = "other"
+LALALAB_ZERO_GROUPBY = [
+    "App", "Month (date)", "Week (date)", "Day (date)",
+    "Network (attribution)", "Country"
+]
+LALALAB_ZERO_SUM = [
+    "Impressions", "Clicks", "Installs", "Adspend",
+    "In-app revenue", "0D All revenue total",
+    "7D All revenue total", "30D All revenue total"
+]
+OTHER_LABEL_COLUMNS = ["Campaign (attribution)", "Adgroup (attribution)", "Creative (attribution)"]
+
+# Plafond top_k (config) : métriques de classement autorisées pour top_k_metric
+TOP_K_METRICS = ["Installs", "Adspend"]
+
+# Ordre des colonnes pour Lalalab
+LALALAB_COLUMNS = [
+    "App",
+    "Month (date)",
+    "Week (date)",
+    "Day (date)",
+    "Network (attribution)",
+    "Country",
+    "Campaign (attribution)",
+    "Adgroup (attribution)",
+    "Creative (attribution)",
+    "Adspend",
+    "Installs",
+    "Impressions",
+    "Clicks",
+    "In-app revenue",
+    "0D All revenue total",
+    "7D All revenue total",
+    "30D All revenue total",
+    "CPI"
+]
+
+
+# =============================================================================
+# UTILITAIRES VECTORISÉS
+# =============================================================================
+
+def is_first_purchase_column(column: str) -> bool:
+    column = column.lower()
+    return 'first_purchase' in column or 'first purchase' in column
+
+
+def map_values(series: pd.Series, mapping: dict) -> np.ndarray:
+    """
+    Series → float64 via une table de correspondance (NaN si absent).
+
+    Sur une colonne category, la table est appliquée aux catégories puis
+    indexée par les codes (pas de lookup dict par ligne).
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        categories = series.cat.categories
+        # Code -1 (valeur manquante) → dernière case = NaN
+        lookup = np.array([mapping.get(c, np.nan) for c in categories] + [np.nan], dtype="float64")
+        return lookup[series.cat.codes.to_numpy()]
+    return series.map(mapping).to_numpy(dtype="float64", na_value=np.nan)
+
+
+def safe_divide(numerator, denominator) -> np.ndarray:
+    """numerator / denominator, 0 là où denominator <= 0."""
+    numerator = np.asarray(numerator, dtype="float64")
+    denominator = np.asarray(denominator, dtype="float64")
+    out = np.zeros(len(numerator), dtype="float64")
+    np.divide(numerator, denominator, out=out, where=denominator > 0)
+    return out
+
+
+def resolve_backend(backend: str = None) -> str:
+    """Backend effectif ("pandas" si polars est demandé mais pas installé)."""
+    backend = backend or TRANSFORM_BACKEND
+    if backend not in ("pandas", "polars"):
+        raise ValueError(f"Backend inconnu: {backend} (attendu: 'pandas' ou 'polars')")
+    if backend == "polars" and not POLARS_AVAILABLE:
+        print("⚠️  polars n'est pas installé (pip3 install polars), transformation en pandas")
+        return "pandas"
+    return backend
+
+
+def encode_keys(series: pd.Series):
+    """
+    Colonne de groupby → (codes int64 avec -1 si manquant, valeurs, décodeur).
+
+    category : codes existants ; autre (dates, texte) : factorize trié. Les
+    codes suivent l'ordre de tri du groupby pandas, et le décodeur
+    (codes → colonne) redonne le dtype de pandas.
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        dtype = series.dtype
+        codes = series.cat.codes.to_numpy().astype("int64")
+        return codes, dtype.categories, lambda codes: pd.Categorical.from_codes(codes, dtype=dtype)
+
+    codes, uniques = pd.factorize(series, sort=True)
+    return codes.astype("int64"), uniques, lambda codes: uniques.take(codes)
+
+
+def group_sum(df: pd.DataFrame, keys: list, values: list) -> pd.DataFrame:
+    """
+    df.groupby(keys, as_index=False, observed=True)[values].sum() en NumPy.
+
+    Les clés sont factorisées (encode_keys) puis combinées en un seul code
+    int64 (base mixte, dans l'ordre de tri du groupby) ; un seul argsort,
+    puis np.add.reduceat par colonne sur les segments de même code.
+    Mêmes lignes, même ordre et mêmes dtypes que le groupby pandas (clés
+    manquantes ignorées, NaN sommés comme 0). Repli sur pandas si une clé
+    n'est pas factorisable ou une colonne pas numérique numpy.
+    """
+    def pandas_group_sum():
+        return df.groupby(keys, as_index=False, observed=True)[values].sum()
+
+    numeric = all(
+        isinstance(df[col].dtype, np.dtype) and df[col].dtype.kind in "iuf" for col in values
+    )
+    if GROUP_SUM_KERNEL != "numpy" or not keys or len(df) == 0 or not numeric:
+        return pandas_group_sum()
+    try:
+        encoded = [encode_keys(df[col]) for col in keys]
+    except TypeError:
+        return pandas_group_sum()
+
+    # Lignes avec une clé manquante exclues (dropna du groupby)
+    valid = np.ones(len(df), dtype=bool)
+    for codes, _, _ in encoded:
+        valid &= codes >= 0
+    rows = None if valid.all() else np.flatnonzero(valid)
+    if rows is not None and len(rows) == 0:
+        return pandas_group_sum()
+
+    # Code composite : code = code × taille + code suivant
+    composite = np.zeros(len(df) if rows is None else len(rows), dtype="int64")
+    span = 1
+    for codes, uniques, _ in encoded:
+        size = max(len(uniques), 1)
+        if span * size >= 2 ** 62:
+            # Trop de combinaisons : re-numérotation dense (np.unique garde l'ordre)
+            composite = np.unique(composite, return_inverse=True)[1].astype("int64")
+            span = int(composite.max()) + 1
+        composite = composite * size + (codes if rows is None else codes[rows])
+        span *= size
+
+    # Un seul tri (introsort, ~4x plus rapide que stable ; l'ordre dans un
+    # groupe ne change que l'arrondi des sommes float), sur int32 si possible
+    if span < 2 ** 31:
+        composite = composite.astype("int32")
+    order = np.argsort(composite)
+    composite = composite[order]
+    if rows is not None:
+        order = rows[order]
+    starts = np.flatnonzero(np.r_[True, composite[1:] != composite[:-1]])
+    first_rows = order[starts]
+
+    result = pd.DataFrame({
+        col: decode(codes[first_rows])
+        for col, (codes, _, decode) in zip(keys, encoded)
+    })
+    for col in values:
+        column = df[col].to_numpy()
+        if column.dtype.kind == "f":
+            summed = np.add.reduceat(np.nan_to_num(column[order], nan=0.0).astype("float64"), starts)
+        else:
+            summed = np.add.reduceat(column[order].astype("int64"), starts)
+        # Même dtype que la somme pandas (int32 reste int32, ...)
+        result[col] = summed.astype(column.dtype)
+    return result
+
+
+def parse_top_k(value) -> int:
+    """Valeur top_k de la config (int, texte du Google Sheet ou vide) → int, 0 = pas de plafond."""
+    if value is None or (isinstance(value, float) and np.isnan(value)) or str(value).strip() == "":
+        return 0
+    top_k = int(float(value))
+    if top_k < 0:
+        raise ValueError(f"top_k doit être positif: {value}")
+    return top_k
+
+
+def format_date_column(series: pd.Series, backend: str = None) -> pd.Series:
+    """Colonne date (texte, category ou datetime) → texte YYYY-MM-DD."""
+    dates = pd.to_datetime(series)
+    if resolve_backend(backend) == "polars":
+        # polars n'accepte pas la résolution seconde de numpy
+        values = dates.to_numpy().astype("datetime64[us]")
+        formatted = pl.Series(values).dt.strftime('%Y-%m-%d').to_numpy()
+        return pd.Series(formatted, index=series.index, name=series.name, dtype="str")
+    return dates.dt.strftime('%Y-%m-%d')
+
+
+def to_polars_column(series: pd.Series):
+    """Colonne numérique pandas → polars (NaN → null, comme skipna en pandas)."""
+    values = series.to_numpy()
+    return pl.Series(series.name, values, nan_to_null=values.dtype.kind == "f")
+
+
+# =============================================================================
+# DEBUG ALLOCATIONS
+# =============================================================================
+
+def format_bytes(n: int) -> str:
+    """Octets → texte lisible (signé)."""
+    sign = "-" if n < 0 else "+"
+    n = abs(n)
+    for unit in ("o", "Ko", "Mo"):
+        if n < 1024:
+            return f"{sign}{n:.0f} {unit}" if unit == "o" else f"{sign}{n:.1f} {unit}"
+        n /= 1024
+    return f"{sign}{n:.1f} Go"
+
+
+class AllocationTracker:
+    """
+    Octets alloués par étape de transformation (tracemalloc).
+
+    Pour chaque étape :
+    - net : mémoire encore allouée à la fin (colonnes ajoutées, copies gardées)
+    - pic : maximum pendant l'étape (copies temporaires comprises)
+
+    Seules les allocations numpy / Python sont suivies (pas les buffers
+    pyarrow des colonnes texte).
+
+    Args:
+        enabled: False → aucune mesure (coût nul)
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.records = []
+        self._started = False
+
+    def __enter__(self):
+        if self.enabled and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started = True
+        return self
+
+    def __exit__(self, *exc):
+        if self._started:
+            tracemalloc.stop()
+            self._started = False
+        return False
+
+    @contextmanager
+    def step(self, name: str):
+        """Mesure le bloc sous le nom name."""
+        if not self.enabled:
+            yield
+            return
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        try:
+            yield
+        finally:
+            current, peak = tracemalloc.get_traced_memory()
+            self.records.append((name, current - before, peak - before))
+
+    def report(self):
+        if not self.enabled or not self.records:
+            return
+        print("   🔬 Allocations par étape:")
+        for name, net, peak in self.records:
+            print(f"      {name:<24} net {format_bytes(net):>10} | pic {format_bytes(peak):>10}")
+
+
+# =============================================================================
+# PLAN
+# =============================================================================
+
+class TransformPlan:
+    """
+    Transformations d'un client, résolues une fois à partir de sa config.
+
+    Args:
+        config: Configuration du client (client, countries, start_date,
+                custom_cpi, agg_columns, ...)
+    """
+
+    def __init__(self, config: dict):
+        self.client = config["client"]
+        self.countries = list(config.get("countries") or [])
+        self.start_date = pd.Timestamp(config["start_date"]) if config.get("start_date") else None
+        self.filter_installs = self.client not in CLIENTS_SANS_FILTRE_INSTALLS
+        self.custom_cpi = dict(config.get("custom_cpi") or {})
+        self.agg_columns = list(config.get("agg_columns") or [])
+        self.group_by_most_spending_campaign = bool(config.get("group_by_most_spending_campaign"))
+        self.is_lalalab = "Lalalab" in self.client
+        self.top_k = parse_top_k(config.get("top_k"))
+        self.top_k_metric = config.get("top_k_metric") or TOP_K_METRICS[0]
+        if self.top_k_metric not in TOP_K_METRICS:
+            raise ValueError(f"top_k_metric inconnu: {self.top_k_metric} (attendu: {', '.join(TOP_K_METRICS)})")
+
+        # Liste fixe des étapes après le filtre
+        self.steps = []
+        if not self.filter_installs:
+            self.steps.append(("fill_impressions", self._fill_impressions))
+        if self.custom_cpi:
+            self.steps.append(("custom_cpi", self._apply_custom_cpi))
+        if self.agg_columns:
+            self.steps.append(("aggregate", self._aggregate))
+        # Avec agg_columns, le regroupement installs=0 est fait dans _aggregate
+        if self.is_lalalab and not self.agg_columns:
+            self.steps.append(("regroup_zero_installs", self._regroup_zero_installs))
+        if self.top_k:
+            self.steps.append(("cap_top_k", self._cap_top_k))
+        if self.is_lalalab:
+            self.steps.append(("reorder_lalalab", self._reorder_lalalab))
+
+    def run(self, df: pd.DataFrame, backend: str = None, debug: bool = None) -> pd.DataFrame:
+        """
+        Applique le plan sur un rapport Adjust brut (df n'est pas modifié).
+
+        Args:
+            backend: "pandas" ou "polars" (défaut: TRANSFORM_BACKEND). Le
+                     backend polars ne remplace que filtres + custom CPI +
+                     groupby ; sans agg_columns tout reste en pandas.
+            debug: Affiche les octets alloués par étape (défaut: TRANSFORM_DEBUG)
+        """
+        tracker = AllocationTracker(TRANSFORM_DEBUG if debug is None else debug)
+        with tracker:
+            steps = self.steps
+            if resolve_backend(backend) == "polars" and self.agg_columns:
+                with tracker.step("aggregate (polars)"):
+                    tmp = self._finish_aggregate(*self._group_sum_polars(df))
+                steps = self._split_steps()[1]
+            else:
+                with tracker.step("filter"):
+                    tmp = self._filter(df)
+
+            tmp = self._run_steps(tmp, steps, tracker)
+        tracker.report()
+        return tmp
+
+    def run_chunked(self, chunks, backend: str = None) -> pd.DataFrame:
+        """
+        Map-reduce out-of-core : agrège chaque chunk (ou shard de dates)
+        séparément puis fusionne les sommes partielles.
+
+        Les sommes étant additives, le résultat a les mêmes valeurs que
+        run(pd.concat(chunks)) ; le CPI et le regroupement installs=0 sont
+        calculés après la fusion. La mémoire dépend du nombre de groupes en
+        sortie (+ un chunk brut), pas du nombre de lignes brutes.
+
+        Args:
+            chunks: Itérable de DataFrames bruts (AdjustClient.iter_report, shards...)
+            backend: "pandas" ou "polars" pour l'agrégation de chaque chunk
+        """
+        if not self.agg_columns:
+            raise ValueError(f"run_chunked nécessite agg_columns ({self.client})")
+
+        use_polars = resolve_backend(backend) == "polars"
+        merged = None
+        pending = []
+        pending_rows = 0
+        n_chunks = 0
+        raw_rows = 0
+
+        for chunk in chunks:
+            n_chunks += 1
+            raw_rows += len(chunk)
+            if use_polars:
+                partial, numeric_cols = self._group_sum_polars(chunk)
+            else:
+                tmp = self._run_steps(self._filter(chunk), self._split_steps()[0])
+                partial, numeric_cols = self._group_sum(tmp)
+            pending.append(partial)
+            pending_rows += len(partial)
+
+            # Fusion dès que les partiels dépassent le résultat courant
+            if pending_rows >= max(COMPACT_MIN_ROWS, len(merged) if merged is not None else 0):
+                merged = self._merge_partials([merged] + pending if merged is not None else pending, numeric_cols)
+                pending, pending_rows = [], 0
+
+        if n_chunks == 0:
+            raise ValueError("run_chunked: aucun chunk reçu")
+        if pending or merged is None:
+            merged = self._merge_partials(([merged] if merged is not None else []) + pending, numeric_cols)
+
+        print(f"   🧩 Map-reduce: {n_chunks} chunks, {raw_rows} lignes brutes → {len(merged)} groupes")
+        tmp = self._finish_aggregate(apply_schema(merged), numeric_cols)
+        return self._run_steps(tmp, self._split_steps()[1])
+
+    def _merge_partials(self, partials: list, numeric_cols: list) -> pd.DataFrame:
+        """Somme des agrégats partiels par agg_columns (trié, comme le groupby direct)."""
+        merged = pd.concat(partials, ignore_index=True)
+        # Catégories différentes d'un chunk à l'autre → clés en valeurs simples
+        for col in merged.columns:
+            if isinstance(merged[col].dtype, pd.CategoricalDtype):
+                merged[col] = merged[col].astype(merged[col].cat.categories.dtype)
+        agg_cols = [c for c in self.agg_columns if c in merged.columns]
+        return group_sum(merged, agg_cols, numeric_cols)
+
+    def _split_steps(self) -> tuple:
+        """(étapes avant l'agrégation, étapes après)."""
+        names = [name for name, _ in self.steps]
+        if "aggregate" not in names:
+            return self.steps, []
+        index = names.index("aggregate")
+        return self.steps[:index], self.steps[index + 1:]
+
+    @staticmethod
+    def _run_steps(tmp: pd.DataFrame, steps: list, tracker: AllocationTracker = None) -> pd.DataFrame:
+        tracker = tracker or AllocationTracker(enabled=False)
+        for name, step in steps:
+            with tracker.step(name):
+                tmp = step(tmp)
+        return tmp
+
+    # -------------------------------------------------------------------------
+    # Étapes
+    # -------------------------------------------------------------------------
+
+    def _filter(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Pays, Sharper, start_date et installs > 0 en un seul masque."""
+        mask = np.ones(len(df), dtype=bool)
+        applied = []
+
+        # ✅ FILTRE PAYS (avant toute autre transformation)
+        if self.countries and "Country" in df.columns:
+            mask &= df["Country"].isin(self.countries).to_numpy()
+            applied.append(f"pays {', '.join(self.countries)}")
+
+        if "Network (attribution)" in df.columns:
+            mask &= (df["Network (attribution)"] == SHARPER_NETWORK).to_numpy(dtype=bool, na_value=False)
+            applied.append("Sharper")
+
+        if self.start_date is not None:
+            days = df["Day (date)"]
+            if not pd.api.types.is_datetime64_any_dtype(days):
+                days = pd.to_datetime(days)
+            mask &= (days >= self.start_date).to_numpy(dtype=bool, na_value=False)
+            applied.append(f"depuis {self.start_date:%Y-%m-%d}")
+
+        if self.filter_installs:
+            mask &= (df["Installs"] > 0).to_numpy(dtype=bool, na_value=False)
+            applied.append("installs > 0")
+        else:
+            print(f"   ⚠️  Pas de filtre installs > 0 pour {self.client}")
+
+        # Lignes et colonnes utiles sélectionnées en une seule copie
+        columns = self._used_columns(df.columns)
+        if applied:
+            tmp = df.loc[mask, columns]
+        elif len(columns) < len(df.columns):
+            tmp = df[columns]
+        else:
+            # Les étapes remplacent des colonnes entières : copie superficielle suffisante
+            tmp = df.copy(deep=False)
+        print(f"   Filtres ({', '.join(applied) or 'aucun'}): {len(df)} → {len(tmp)} lignes")
+        return tmp
+
+    def _used_columns(self, columns) -> list:
+        """Colonnes de df lues par les étapes (toutes sans agg_columns)."""
+        if not self.agg_columns:
+            return list(columns)
+        used = set(self.agg_columns) | set(self._sum_columns(columns))
+        if self.custom_cpi:
+            used |= {"Country", "Installs"}
+        return [c for c in columns if c in used]
+
+    def _fill_impressions(self, tmp: pd.DataFrame) -> pd.DataFrame:
+        if tmp["Impressions"].hasnans:
+            tmp["Impressions"] = tmp["Impressions"].fillna(0)
+        return tmp
+
+    def _apply_custom_cpi(self, tmp: pd.DataFrame) -> pd.DataFrame:
+        """CPI par pays (0 hors custom_cpi) et Adspend = Installs × CPI."""
+        for country, cpi in self.custom_cpi.items():
+            print(f"   Custom CPI {country}: {cpi}€")
+
+        cpi = np.nan_to_num(map_values(tmp["Country"], self.custom_cpi), nan=0.0)
+        installs = tmp["Installs"].to_numpy(dtype="float64", na_value=np.nan)
+        tmp["CPI"] = cpi
+        tmp["Adspend"] = np.where(cpi != 0, installs * cpi, 0.0)
+        return tmp
+
+    @staticmethod
+    def _sum_columns(columns) -> list:
+        """Colonnes sommées présentes parmi columns."""
+        # ✅ Colonnes d'événements (ex: First Purchase)
+        event_columns = [c for c in columns if any(ev in c.lower() for ev in EVENT_PATTERNS)]
+        return [c for c in dict.fromkeys(NUMERIC_COLS_TO_SUM + event_columns) if c in columns]
+
+    def _aggregation_columns(self, columns) -> tuple:
+        """(colonnes de groupby, colonnes sommées) présentes parmi columns."""
+        if self.group_by_most_spending_campaign:
+            print("   Grouping by most spending campaign...")
+
+        agg_cols = [c for c in self.agg_columns if c in columns]
+        numeric_cols = self._sum_columns(columns)
+
+        print(f"   Agrégation sur: {agg_cols}")
+        print(f"   Somme de: {numeric_cols}")
+        return agg_cols, numeric_cols
+
+    def _aggregate(self, tmp: pd.DataFrame) -> pd.DataFrame:
+        """Groupby agg_columns + somme, puis CPI recalculé."""
+        return self._finish_aggregate(*self._group_sum(tmp))
+
+    def _group_sum(self, tmp: pd.DataFrame) -> tuple:
+        """Groupby agg_columns + somme → (agrégat, colonnes sommées)."""
+        agg_cols, numeric_cols = self._aggregation_columns(tmp.columns)
+
+        # Groupby et somme (noyau NumPy, repli pandas : voir group_sum)
+        tmp = group_sum(tmp, agg_cols, numeric_cols)
+        return tmp, numeric_cols
+
+    def _group_sum_polars(self, df: pd.DataFrame) -> tuple:
+        """
+        Filtre + custom CPI + groupby/somme en polars (multi-thread)
+        → (agrégat, colonnes sommées).
+
+        Les clés passent sous forme de codes entiers (encode_keys) : pas de
+        conversion de chaînes, et le résultat est décodé vers les dtypes
+        pandas d'origine.
+        """
+        # Colonnes vues par l'agrégation (Adspend créé par les custom CPI)
+        columns = list(df.columns)
+        if self.custom_cpi and "Adspend" not in columns:
+            columns.append("Adspend")
+        agg_cols, numeric_cols = self._aggregation_columns(columns)
+
+        encoded = {col: encode_keys(df[col]) for col in agg_cols}
+        data = pl.DataFrame(
+            [pl.Series(f"k{i}", encoded[col][0]) for i, col in enumerate(agg_cols)]
+            + [to_polars_column(df[col]).alias(f"v{i}") for i, col in enumerate(numeric_cols) if col in df.columns]
+        )
+
+        def codes_of(col: str, values: list) -> pl.Series:
+            """Codes de la colonne + codes des valeurs de filtre (même table)."""
+            if col not in encoded:
+                encoded[col] = encode_keys(df[col])
+            codes, uniques, _ = encoded[col]
+            wanted = [int(c) for c in uniques.get_indexer(values) if c >= 0]
+            return pl.Series(codes).is_in(wanted)
+
+        # Filtres (même logique que _filter) combinés en un seul masque
+        conditions = []
+        applied = []
+        if self.countries and "Country" in df.columns:
+            conditions.append(codes_of("Country", self.countries))
+            applied.append(f"pays {', '.join(self.countries)}")
+        if "Network (attribution)" in df.columns:
+            conditions.append(codes_of("Network (attribution)", [SHARPER_NETWORK]))
+            applied.append("Sharper")
+        if self.start_date is not None:
+            days = df["Day (date)"]
+            if not pd.api.types.is_datetime64_any_dtype(days):
+                days = pd.to_datetime(days)
+            # Entiers dans l'unité de la colonne (NaT = min int64 → exclu)
+            start = np.datetime64(self.start_date.to_datetime64()).astype(days.dtype).view("int64")
+            conditions.append(pl.Series(days.to_numpy().view("int64")) >= start)
+            applied.append(f"depuis {self.start_date:%Y-%m-%d}")
+        if self.filter_installs:
+            conditions.append((to_polars_column(df["Installs"]) > 0).fill_null(False))
+            applied.append("installs > 0")
+        else:
+            print(f"   ⚠️  Pas de filtre installs > 0 pour {self.client}")
+
+        # Custom CPI : Country → CPI puis Adspend = Installs × CPI
+        if self.custom_cpi:
+            for country, cpi in self.custom_cpi.items():
+                print(f"   Custom CPI {country}: {cpi}€")
+            data = data.with_columns(
+                pl.Series("cpi", np.nan_to_num(map_values(df["Country"], self.custom_cpi), nan=0.0)),
+                to_polars_column(df["Installs"]).cast(pl.Float64).alias("installs")
+            ).with_columns(
+                pl.when(pl.col("cpi") != 0)
+                .then(pl.col("installs") * pl.col("cpi"))
+                .otherwise(0.0)
+                .alias(f"v{numeric_cols.index('Adspend')}")
+            ).drop("cpi", "installs")
+
+        if conditions:
+            mask = conditions[0]
+            for condition in conditions[1:]:
+                mask = mask & condition
+            data = data.filter(mask)
+        print(f"   Filtres ({', '.join(applied) or 'aucun'}): {len(df)} → {len(data)} lignes")
+
+        # Groupby + somme ; clés manquantes (-1) ignorées comme dropna en pandas
+        keys = [f"k{i}" for i in range(len(agg_cols))]
+        data = data.filter(pl.all_horizontal([pl.col(k) >= 0 for k in keys]))
+
+        # Clés combinées en un seul entier (base mixte) : groupby + tri sur une colonne
+        sizes = [len(encoded[col][1]) for col in agg_cols]
+        if 0 < np.prod([float(n) for n in sizes]) < 2 ** 62:
+            strides = np.cumprod([1] + sizes[::-1][:-1])[::-1]
+            combined = pl.sum_horizontal([pl.col(k) * int(stride) for k, stride in zip(keys, strides)])
+            grouped = (
+                data.group_by(combined.alias("key"))
+                .agg([pl.col(f"v{i}").sum() for i in range(len(numeric_cols))])
+                .sort("key")
+            )
+            combined_keys = grouped["key"].to_numpy()
+            grouped = grouped.with_columns([
+                pl.Series(k, (combined_keys // int(stride)) % size)
+                for k, stride, size in zip(keys, strides, sizes)
+            ])
+        else:
+            grouped = (
+                data.group_by(keys)
+                .agg([pl.col(f"v{i}").sum() for i in range(len(numeric_cols))])
+                .sort(keys)
+            )
+
+        tmp = pd.DataFrame({
+            col: encoded[col][2](grouped[f"k{i}"].to_numpy())
+            for i, col in enumerate(agg_cols)
+        })
+        for i, col in enumerate(numeric_cols):
+            # Même dtype que la somme pandas (int32 reste int32, ...)
+            dtype = df[col].dtype if col in df.columns else np.dtype("float64")
+            tmp[col] = grouped[f"v{i}"].to_numpy().astype(dtype)
+
+        return tmp, numeric_cols
+
+    def _finish_aggregate(self, tmp: pd.DataFrame, numeric_cols: list) -> pd.DataFrame:
+        """Après le groupby : regroupement installs=0 (Lalalab) et CPI."""
+        regroup_zero = self.is_lalalab and "Installs" in tmp.columns
+        if regroup_zero:
+            tmp = self._collapse_zero_installs(tmp, numeric_cols)
+
+        # ✅ Recalcule CPI après l'agrégation (0 pour les lignes installs=0)
+        if "Adspend" in tmp.columns and "Installs" in tmp.columns:
+            tmp["CPI"] = safe_divide(tmp["Adspend"], tmp["Installs"])
+
+        print(f"   Après agrégation: {len(tmp)} lignes")
+        return tmp
+
+    def _collapse_zero_installs(self, agg: pd.DataFrame, numeric_cols: list) -> pd.DataFrame:
+        """
+        Lalalab : fusionne, dans le résultat agrégé, les lignes installs=0 d'un
+        même jour / pays en une ligne campagne / adgroup / créa = "other".
+        """
+        zero_rows = np.flatnonzero((agg["Installs"] == 0).to_numpy(dtype=bool, na_value=False))
+        if len(zero_rows) == 0:
+            return agg
+
+        print(f"   Avant regroupement installs=0: {len(agg)} lignes")
+        agg = self._fold_rows(agg, zero_rows, numeric_cols)
+        print(f"   Après regroupement installs=0: {len(agg)} lignes")
+        return agg
+
+    def _fold_rows(self, agg: pd.DataFrame, rows: np.ndarray, numeric_cols: list) -> pd.DataFrame:
+        """
+        Fusionne les lignes rows (positions croissantes) d'un même jour / pays
+        en une ligne campagne / adgroup / créa = "other", métriques sommées.
+
+        Pas de split en deux copies ni de concat : la première ligne de chaque
+        groupe reçoit les sommes et le label "other", les autres sont retirées.
+        """
+        # Groupe jour / pays de chaque ligne fusionnée (petit groupby sur le résultat agrégé)
+        folded = agg.iloc[rows]
+        groupby_cols = [c for c in LALALAB_ZERO_GROUPBY if c in agg.columns]
+        if groupby_cols:
+            group_ids = folded.groupby(groupby_cols, observed=True, sort=False, dropna=False).ngroup().to_numpy()
+        else:
+            group_ids = np.zeros(len(rows), dtype="int64")
+        # sort=False : groupes numérotés par première apparition → first_rows croissant
+        first_rows = rows[np.unique(group_ids, return_index=True)[1]]
+
+        keep = np.ones(len(agg), dtype=bool)
+        keep[rows] = False
+        keep[first_rows] = True
+        labelled = np.zeros(len(agg), dtype=bool)
+        labelled[first_rows] = True
+
+        # Lignes retirées d'abord : sommes et "other" posés sur le frame réduit (nouveau frame)
+        agg = agg[keep].reset_index(drop=True)
+        labelled = labelled[keep]
+        positions = np.flatnonzero(labelled)
+        for col in numeric_cols:
+            sums = np.bincount(group_ids, weights=folded[col].to_numpy(dtype="float64", na_value=0.0))
+            agg.iloc[positions, agg.columns.get_loc(col)] = sums.astype(agg[col].dtype)
+        agg = self._label_other(agg, labelled, [c for c in OTHER_LABEL_COLUMNS if c in agg.columns])
+
+        # Ordre par jour comme l'ancien concat + sort (déjà le cas si App est unique)
+        if "Day (date)" in agg.columns and not agg["Day (date)"].is_monotonic_increasing:
+            agg = agg.sort_values("Day (date)", kind="stable")
+        return agg
+
+    def _cap_top_k(self, tmp: pd.DataFrame) -> pd.DataFrame:
+        """
+        Garde les top_k combinaisons campagne / adgroup / créa par jour / pays
+        (classées par top_k_metric), le reste est fusionné dans "other".
+        """
+        label_cols = [c for c in OTHER_LABEL_COLUMNS if c in tmp.columns]
+        if not label_cols or self.top_k_metric not in tmp.columns or len(tmp) == 0:
+            return tmp
+
+        groupby_cols = [c for c in LALALAB_ZERO_GROUPBY if c in tmp.columns]
+        if groupby_cols:
+            group_ids = tmp.groupby(groupby_cols, observed=True, sort=False, dropna=False).ngroup().to_numpy()
+        else:
+            group_ids = np.zeros(len(tmp), dtype="int64")
+        metric = tmp[self.top_k_metric].to_numpy(dtype="float64", na_value=0.0)
+
+        # Lignes déjà "other" (installs=0) : jamais dans le top, fusionnées avec la traîne
+        is_other = np.ones(len(tmp), dtype=bool)
+        for col in label_cols:
+            is_other &= (tmp[col] == OTHER_LABEL).to_numpy(dtype=bool, na_value=False)
+
+        # Rang dans le groupe : métrique décroissante, ex æquo dans l'ordre des lignes
+        order = np.lexsort((-metric, is_other, group_ids))
+        sorted_groups = group_ids[order]
+        is_start = np.r_[True, sorted_groups[1:] != sorted_groups[:-1]]
+        group_start = np.maximum.accumulate(np.where(is_start, np.arange(len(tmp)), 0))
+        rank = np.empty(len(tmp), dtype="int64")
+        rank[order] = np.arange(len(tmp)) - group_start
+
+        rows = np.flatnonzero((rank >= self.top_k) | is_other)
+        if len(rows) == 0:
+            return tmp
+
+        before = len(tmp)
+        tmp = self._fold_rows(tmp, rows, self._sum_columns(tmp.columns))
+        if "Adspend" in tmp.columns and "Installs" in tmp.columns:
+            tmp["CPI"] = safe_divide(tmp["Adspend"], tmp["Installs"])
+        print(f"   ✂️  Top {self.top_k} par jour / pays ({self.top_k_metric}): {before} → {len(tmp)} lignes")
+        return tmp
+
+    def _label_other(self, tmp: pd.DataFrame, rows: np.ndarray, label_cols: list) -> pd.DataFrame:
+        """Campagne / adgroup / créa → "other" sur les lignes données."""
+        for col in label_cols:
+            values = tmp[col]
+            if isinstance(values.dtype, pd.CategoricalDtype) and OTHER_LABEL not in values.cat.categories:
+                values = values.cat.add_categories([OTHER_LABEL])
+            tmp[col] = values.where(~rows, OTHER_LABEL)
+        return tmp
+
+    def _regroup_zero_installs(self, tmp: pd.DataFrame) -> pd.DataFrame:
+        """Lalalab sans agg_columns : lignes installs=0 regroupées par jour avec le label "other"."""
+        if "Installs" not in tmp.columns:
+            return tmp
+
+        print(f"   Avant regroupement installs=0: {len(tmp)} lignes")
+
+        # Sépare les lignes avec et sans installs
+        tmp_with_installs = tmp[tmp["Installs"] > 0]
+        tmp_zero_installs = tmp[tmp["Installs"] == 0]
+
+        if len(tmp_zero_installs) == 0:
+            return tmp
+
+        groupby_cols = [c for c in LALALAB_ZERO_GROUPBY if c in tmp_zero_installs.columns]
+        numeric_cols = [c for c in tmp_zero_installs.columns
+                        if c in LALALAB_ZERO_SUM or is_first_purchase_column(c)]
+
+        # Regroupe les installs=0 par jour
+        tmp_zero_grouped = group_sum(tmp_zero_installs, groupby_cols, numeric_cols)
+
+        # CPI = 0 pour les lignes installs=0
+        if "Adspend" in tmp_zero_grouped.columns and "Installs" in tmp_zero_grouped.columns:
+            tmp_zero_grouped["CPI"] = 0
+
+        for col in OTHER_LABEL_COLUMNS:
+            tmp_zero_grouped[col] = OTHER_LABEL
+
+        # Recombine
+        tmp = pd.concat([tmp_with_installs, tmp_zero_grouped], ignore_index=True)
+        tmp = tmp.sort_values("Day (date)")
+
+        print(f"   Après regroupement installs=0: {len(tmp)} lignes")
+        return tmp
+
+    def _reorder_lalalab(self, tmp: pd.DataFrame) -> pd.DataFrame:
+        """Réordonnancement des colonnes pour Lalalab (+ First Purchase si présent)."""
+        lalalab_columns = LALALAB_COLUMNS + [c for c in tmp.columns if is_first_purchase_column(c)]
+
+        # Garde uniquement les colonnes qui existent
+        existing_cols = [col for col in lalalab_columns if col in tmp.columns]
+        print(f"   Colonnes Lalalab réordonnées: {len(existing_cols)} colonnes")
+        if list(tmp.columns) == existing_cols:
+            return tmp
+        return tmp[existing_cols]
+
+
+# Un plan compilé par config (les runs multi-clients réutilisent le même)
+_PLANS = {}
+
+
+def compile_transform_plan(config: dict) -> TransformPlan:
+    """Retourne le plan de la config (compilé au premier appel)."""
+    key = json.dumps(config, sort_keys=True, default=str)
+    plan = _PLANS.get(key)
+    if plan is None:
+        plan = _PLANS[key] = TransformPlan(config)
+    return plan
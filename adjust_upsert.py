@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+ADJUST UPSERT
+Fusion vectorisée sheet existant ← nouvelles données Adjust
+
+smart_push_daily, update_revenues_30d et update_revenues_only faisaient la
+même chose avec deux boucles iterrows (dict des revenues puis .at[] ligne
+par ligne) : plusieurs minutes de Python pur sur un sheet de 200k lignes.
+
+Ici, en une passe vectorisée :
+- clés : chaque ligne reçoit un hash uint64 de sa combinaison de dimensions
+  (forme texte normalisée, hash_pandas_object), vérifié contre les
+  collisions ; en cas de collision, codes exacts (factorize) à la place
+- alignement : get_indexer sur ces clés
+- mise à jour : colonnes remplacées par un where sur les lignes trouvées
+  (si une clé est en double dans les nouvelles données, la dernière gagne,
+  comme l'ancien dict)
+- ajouts : lignes nouvelles dont la clé n'existe pas dans le sheet
+
+Usage:
+    from adjust_upsert import upsert, SHEET_JOIN_KEYS, REVENUE_COLUMNS
+    updated, inserts, n_updated, n_inserted = upsert(df_existing, df_new, join_keys, revenue_cols)
+"""
+
+import pandas as pd
+import numpy as np
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+# Dimensions qui identifient une ligne des sheets Lalalab
+SHEET_JOIN_KEYS = [
+    'App', 'Month (date)', 'Week (date)', 'Day (date)',
+    'Network (attribution)', 'Country',
+    'Campaign (attribution)', 'Adgroup (attribution)', 'Creative (attribution)'
+]
+
+# Revenues qui mûrissent (d0/d7/d30) : seules colonnes remplacées sur les lignes existantes
+REVENUE_COLUMNS = ['0D All revenue total', '7D All revenue total', '30D All revenue total']
+
+
+# =============================================================================
+# CLÉS
+# =============================================================================
+
+def common_columns(candidates: list, *dfs: pd.DataFrame) -> list:
+    """Colonnes de candidates présentes dans tous les DataFrames (ordre conservé)."""
+    return [c for c in candidates if all(c in df.columns for df in dfs)]
+
+
+def _normalized_keys(df_existing: pd.DataFrame, df_new: pd.DataFrame, join_keys: list) -> pd.DataFrame:
+    """Dimensions des deux DataFrames (l'un sous l'autre) sous leur forme texte."""
+    return pd.DataFrame({
+        col: pd.concat([df_existing[col], df_new[col]], ignore_index=True).astype(str)
+        for col in join_keys
+    })
+
+
+def has_collisions(keys: np.ndarray, normalized: pd.DataFrame) -> bool:
+    """
+    True si deux combinaisons de dimensions différentes ont la même clé.
+
+    Chaque ligne est comparée (colonne par colonne, vectorisé) à la première
+    ligne qui porte la même clé.
+    """
+    key_codes, _ = pd.factorize(keys)
+    first = pd.Series(key_codes).drop_duplicates().index.to_numpy()
+    representative = first[key_codes]
+    for col in normalized.columns:
+        values = normalized[col].to_numpy()
+        if not (values == values[representative]).all():
+            return True
+    return False
+
+
+def row_keys(df_existing: pd.DataFrame, df_new: pd.DataFrame, join_keys: list) -> tuple:
+    """
+    Clé uint64 par ligne : même combinaison de dimensions → même clé dans
+    les deux DataFrames.
+
+    Les dimensions sont comparées sous leur forme texte (comme l'ancienne
+    clé astype(str) + '||'.join) et hashées ensemble par hash_pandas_object,
+    sans boucle Python par ligne. Si le hash fait collision, row_codes
+    (exact) prend le relais.
+    """
+    n_existing = len(df_existing)
+    normalized = _normalized_keys(df_existing, df_new, join_keys)
+    keys = pd.util.hash_pandas_object(normalized, index=False).to_numpy()
+
+    if has_collisions(keys, normalized):
+        print("   ⚠️  Collision de hash sur les clés, codes exacts utilisés")
+        keys = row_codes(df_existing, df_new, join_keys, normalized=normalized)
+        keys = np.concatenate(keys).view("uint64")
+    return keys[:n_existing], keys[n_existing:]
+
+
+def row_codes(
+    df_existing: pd.DataFrame,
+    df_new: pd.DataFrame,
+    join_keys: list,
+    normalized: pd.DataFrame = None
+) -> tuple:
+    """
+    Code int64 par ligne : même combinaison de dimensions → même code dans
+    les deux DataFrames.
+
+    Les dimensions sont comparées sous leur forme texte (comme l'ancienne
+    clé astype(str) + '||'.join), factorisées colonne par colonne sur les
+    deux DataFrames à la fois puis combinées en base mixte.
+    """
+    n_existing = len(df_existing)
+    if normalized is None:
+        normalized = _normalized_keys(df_existing, df_new, join_keys)
+    codes = np.zeros(n_existing + len(df_new), dtype="int64")
+    for col in join_keys:
+        col_codes, uniques = pd.factorize(normalized[col])
+        size = max(len(uniques), 1)
+        if codes.max(initial=0) >= 2 ** 62 // size:
+            # Trop de combinaisons : re-numérotation dense avant la colonne suivante
+            codes = pd.factorize(codes)[0].astype("int64")
+        codes = codes * size + col_codes
+    return codes[:n_existing], codes[n_existing:]
+
+
+# =============================================================================
+# UPSERT
+# =============================================================================
+
+def upsert(
+    df_existing: pd.DataFrame,
+    df_new: pd.DataFrame,
+    join_keys: list,
+    update_cols: list
+) -> tuple:
+    """
+    Aligne df_new sur df_existing par join_keys.
+
+    Args:
+        df_existing: Contenu actuel du sheet (n'est pas modifié)
+        df_new: Nouvelles données
+        join_keys: Dimensions qui identifient une ligne
+        update_cols: Colonnes remplacées sur les lignes existantes retrouvées
+
+    Returns:
+        (df_existing mis à jour, lignes de df_new à ajouter,
+         nb lignes mises à jour, nb lignes ajoutées)
+    """
+    existing_codes, new_codes = row_keys(df_existing, df_new, join_keys)
+
+    # Clé en double dans df_new : la dernière occurrence gagne
+    last = ~pd.Index(new_codes).duplicated(keep="last")
+    lookup = pd.Index(new_codes[last])
+    source_rows = np.flatnonzero(last)
+
+    # Ligne source de chaque ligne existante (-1 si absente des nouvelles données)
+    position = lookup.get_indexer(existing_codes)
+    matched = position >= 0
+    n_updated = int(matched.sum())
+
+    updated = df_existing.copy(deep=False)
+    if n_updated:
+        source = source_rows[np.where(matched, position, 0)]
+        for col in update_cols:
+            aligned = df_new[col].to_numpy()[source]
+            updated[col] = updated[col].where(~matched, aligned)
+
+    # Lignes nouvelles : clé absente du sheet (doublons compris, comme avant)
+    is_insert = ~pd.Index(new_codes).isin(existing_codes)
+    inserts = df_new[is_insert]
+
+    return updated, inserts, n_updated, len(inserts)
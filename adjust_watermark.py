@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+ADJUST WATERMARK
+Pulls incrémentaux par client au lieu de re-télécharger tout le mois
+
+Pour chaque client on garde en local :
+- le rapport Adjust brut déjà ingéré (pickle)
+- le watermark = dernier jour complètement ingéré
+
+Au run suivant, seuls les nouveaux jours + la fenêtre encore « en
+maturation » sont re-téléchargés :
+- avec revenues : 30 jours (all_revenue_total_d30 bouge pendant 30 jours)
+- sans revenues : 2 jours (attributions tardives)
+puis fusionnés avec l'historique local. Le DataFrame obtenu est le même
+qu'un pull complet de begin_date → end_date.
+
+Si la config de pull change (dimensions, métriques, begin_date...),
+le client repart d'un pull complet.
+"""
+
+import pandas as pd
+import os
+import re
+import json
+import hashlib
+from datetime import datetime, timedelta
+
+from adjust_cache import REVENUE_MATURATION_DAYS
+from adjust_schema import apply_schema
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+DEFAULT_WATERMARK_DIR = ".adjust_watermarks"
+SETTLE_DAYS = 2  # Sans revenues : jours re-téléchargés pour les attributions tardives
+
+
+# =============================================================================
+# STORE
+# =============================================================================
+
+def _fingerprint(pull_kwargs: dict) -> str:
+    """Hash des paramètres de pull hors période (dimensions, métriques, events...)."""
+    kwargs = {k: v for k, v in (pull_kwargs or {}).items() if k not in ("begin_date", "end_date")}
+    canonical = json.dumps(kwargs, sort_keys=True, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+class WatermarkStore:
+    """
+    Watermarks + historique brut par client.
+
+    Args:
+        store_dir: Dossier de stockage
+    """
+
+    def __init__(self, store_dir: str = DEFAULT_WATERMARK_DIR):
+        self.store_dir = store_dir
+        os.makedirs(store_dir, exist_ok=True)
+
+    def _paths(self, config: dict):
+        key = re.sub(r'[^A-Za-z0-9_-]+', '_', f"{config['client']}_{config.get('app_token', '')}")
+        base = os.path.join(self.store_dir, key)
+        return base + ".pkl", base + ".json"
+
+    def _load_meta(self, config: dict):
+        data_path, meta_path = self._paths(config)
+        if not (os.path.exists(data_path) and os.path.exists(meta_path)):
+            return None
+        with open(meta_path) as f:
+            return json.load(f)
+
+    def fetch_begin(self, config: dict, begin_date: str, end_date: str, pull_kwargs: dict = None) -> str:
+        """
+        Première date à re-télécharger pour ce run.
+
+        Retourne begin_date (pull complet) s'il n'y a pas d'historique
+        compatible, sinon le début de la fenêtre de maturation après le
+        watermark.
+        """
+        meta = self._load_meta(config)
+        if (
+            meta is None
+            or meta["begin_date"] != begin_date
+            or meta["fingerprint"] != _fingerprint(pull_kwargs)
+        ):
+            return begin_date
+
+        include_revenue = (pull_kwargs or {}).get("include_revenue", False)
+        window_days = REVENUE_MATURATION_DAYS if include_revenue else SETTLE_DAYS
+
+        watermark = datetime.strptime(meta["watermark"], "%Y-%m-%d").date()
+        window_start = watermark - timedelta(days=window_days - 1)
+        fetch_begin = max(begin_date, window_start.strftime("%Y-%m-%d"))
+
+        # Watermark déjà au-delà de end_date (re-run d'une date passée) → pull complet
+        if fetch_begin > end_date:
+            return begin_date
+        return fetch_begin
+
+    def merge(
+        self,
+        config: dict,
+        df_new: pd.DataFrame,
+        fetch_begin: str,
+        begin_date: str,
+        end_date: str,
+        pull_kwargs: dict = None
+    ) -> pd.DataFrame:
+        """
+        Remplace les jours >= fetch_begin de l'historique par df_new,
+        sauvegarde le résultat avec le nouveau watermark (end_date).
+
+        Returns:
+            Rapport brut complet begin_date → end_date
+        """
+        data_path, meta_path = self._paths(config)
+
+        if fetch_begin == begin_date:
+            df = df_new
+        else:
+            df_old = pd.read_pickle(data_path)
+            keep = pd.to_datetime(df_old['Day (date)']) < pd.to_datetime(fetch_begin)
+            # Catégories différentes entre historique et nouveau → schéma réappliqué
+            df = apply_schema(pd.concat([df_old[keep], df_new], ignore_index=True))
+            df = df.sort_values('Day (date)', kind='stable')
+            print(f"   🔖 Incrémental: {keep.sum()} lignes historiques + {len(df_new)} lignes re-téléchargées")
+
+        meta = {
+            "begin_date": begin_date,
+            "watermark": end_date,
+            "fingerprint": _fingerprint(pull_kwargs),
+            "rows": len(df)
+        }
+        df.to_pickle(data_path + ".tmp")
+        with open(meta_path + ".tmp", "w") as f:
+            json.dump(meta, f)
+        os.replace(data_path + ".tmp", data_path)
+        os.replace(meta_path + ".tmp", meta_path)
+
+        return df
@@ -0,0 +1,71 @@
+"""
+Pull asynchrone : une rafale de 429 doit ralentir tout le token et
+s'arrêter une fois le budget de retries du client épuisé.
+"""
+
+import asyncio
+
+import adjust_async
+import adjust_client
+from adjust_client import AdjustClient, TokenBucket, RETRY_BUDGET_MIN, RETRY_BUDGET_RATIO
+
+
+class _Response:
+    status = 429
+    headers = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def read(self):
+        return b"Too Many Requests"
+
+
+class _ThrottledSession:
+    """Session aiohttp factice : toutes les requêtes renvoient 429."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def get(self, url, params=None, headers=None):
+        self.calls += 1
+        return _Response()
+
+
+def test_429_burst_throttles_token_and_respects_retry_budget(monkeypatch):
+    async def no_sleep(delay):
+        pass
+
+    monkeypatch.setattr(adjust_async.asyncio, "sleep", no_sleep)
+    monkeypatch.setattr(adjust_client.random, "uniform", lambda a, b: 0.0)
+
+    limiter = TokenBucket(rate=1000, burst=1000, max_rate=1000, min_rate=100)
+    client = AdjustClient("api-token", cache=None, rate_limiter=limiter)
+    session = _ThrottledSession()
+    jobs = 20
+
+    async def run():
+        semaphore = asyncio.Semaphore(10)
+        return await asyncio.gather(
+            *(
+                adjust_async._fetch_report(
+                    session, semaphore, client, {"date_period": f"2025-11-{day:02d}:2025-11-{day:02d}"}, None
+                )
+                for day in range(1, jobs + 1)
+            ),
+            return_exceptions=True
+        )
+
+    results = asyncio.run(run())
+
+    assert all(isinstance(result, ValueError) for result in results)
+    # Chaque 429 a réduit le débit du token partagé
+    assert limiter.rate < 1000
+    # Retries bornés par le budget du client, pas par max_retries × jobs
+    assert client.request_count == session.calls
+    assert client.retry_count <= RETRY_BUDGET_MIN + RETRY_BUDGET_RATIO * client.request_count + 1
+    assert not client.take_retry_budget()
+    assert session.calls < jobs * (client.max_retries + 1)